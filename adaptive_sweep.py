@@ -0,0 +1,172 @@
+import itertools
+import numpy as np
+
+from sweep import _axis_bounds, _check_axis_names, _is_int_field
+
+"""
+Adaptive sweeps. Rather than a fixed step along every axis, the design space
+starts as a coarse grid of cells and only the cells whose corner values of
+a metric differ by more than the tolerance are subdivided, so the cases are
+concentrated where the response changes sharply.
+
+The metric is either a callable evaluated as the sweep refines (e.g. the
+shading_screen estimate, see screen_metric) or the results of cases already
+simulated, in which case AdaptiveRefinement.propose gives the next batch of
+cases to run. Axes are given as (start_value, end_value) bounds, as for the
+sampled methods in sweep.py.
+"""
+
+
+class AdaptiveRefinement:
+    """
+    Hierarchical refinement of the cells of a grid over the axes.
+    Each round every cell whose corner values vary by more than tolerance is
+    split in half along each axis, largest variation first
+    """
+
+    def __init__(self, axes: dict, tolerance: float, initial=3):
+        _check_axis_names(axes)
+        if initial < 2:
+            raise ValueError("initial must be at least 2 values per axis")
+        self.names = list(axes.keys())
+        self.tolerance = tolerance
+        self._int = [_is_int_field(name) for name in self.names]
+        bounds = [_axis_bounds(name, spec) for name, spec in axes.items()]
+        self._span = [max(high - low, 1e-9) for low, high in bounds]
+        edges = [
+            sorted(set(self._point(np.linspace(low, high, initial).tolist(), axis=i)))
+            for i, (low, high) in enumerate(bounds)
+        ]
+        self._cells = list(
+            itertools.product(*[list(zip(e[:-1], e[1:])) or [(e[0], e[0])] for e in edges])
+        )
+        self._values = {}
+
+    def _point(self, values, axis=None):
+        """
+        rounds values to 3dp, or to int for int fields, as sweep.py
+        """
+        if axis is not None:
+            return [int(round(v)) if self._int[axis] else round(v, 3) for v in values]
+        return tuple(
+            int(round(v)) if is_int else round(v, 3) for v, is_int in zip(values, self._int)
+        )
+
+    def _case(self, point):
+        return dict(zip(self.names, point))
+
+    @staticmethod
+    def _corners(cell):
+        return list(itertools.product(*cell))
+
+    def _split(self, cell):
+        """
+        the sub cells of cell, or [] if it can not be split any further
+        """
+        halves = []
+        for i, (low, high) in enumerate(cell):
+            middle = (low + high) // 2 if self._int[i] else round((low + high) / 2, 3)
+            if low < middle < high:
+                halves.append([(low, middle), (middle, high)])
+            else:
+                halves.append([(low, high)])
+        if all(len(h) == 1 for h in halves):
+            return []
+        return list(itertools.product(*halves))
+
+    def _variation(self, cell):
+        values = [self._values[c] for c in self._corners(cell)]
+        return max(values) - min(values)
+
+    def add(self, case: dict, value: float):
+        """
+        records the metric value of a case (a dict containing the axis values)
+        """
+        self._values[self._point([case[name] for name in self.names])] = float(value)
+
+    def propose(self, max_cases=None) -> list:
+        """
+        the cases to evaluate next: the missing corners of the current cells,
+        or else the new corners from splitting the cells that vary by more
+        than tolerance. At most max_cases are proposed and only whole cells
+        are split. Returns [] once the sweep has converged
+        """
+        budget = np.inf if max_cases is None else max_cases
+        missing = {c for cell in self._cells for c in self._corners(cell)} - set(self._values)
+        if missing:
+            return [self._case(p) for p in sorted(missing)[: int(min(budget, len(missing)))]]
+
+        def score(cell):
+            size = np.prod([(high - low) / s for (low, high), s in zip(cell, self._span)])
+            return self._variation(cell) * size
+
+        candidates = [c for c in self._cells if self._variation(c) > self.tolerance]
+        proposed = set()
+        for cell in sorted(candidates, key=score, reverse=True):
+            sub_cells = self._split(cell)
+            new = {
+                c for sub in sub_cells for c in self._corners(sub)
+            } - set(self._values) - proposed
+            if not sub_cells or len(proposed) + len(new) > budget:
+                continue
+            proposed |= new
+            self._cells.remove(cell)
+            self._cells.extend(sub_cells)
+        return [self._case(p) for p in sorted(proposed)]
+
+    def run(self, metric, max_cases=None) -> list:
+        """
+        refines until converged or max_cases have been evaluated. metric takes
+        a list of cases (dicts of the axis values) and returns their values,
+        each round is evaluated in one call. Returns the cases evaluated
+        """
+        evaluated = []
+        while True:
+            remaining = None if max_cases is None else max_cases - len(evaluated)
+            cases = self.propose(remaining)
+            if not cases:
+                return evaluated
+            for case, value in zip(cases, metric(cases)):
+                self.add(case, value)
+            evaluated += cases
+
+    @property
+    def cases(self) -> list:
+        return [self._case(p) for p in self._values]
+
+    @property
+    def values(self) -> list:
+        return list(self._values.values())
+
+
+def adaptive_cases(axes: dict, metric, tolerance, max_cases=None, initial=3, known=()):
+    """
+    returns the list of new cases (dicts of the axis values) evaluated while
+    refining the axes until the metric varies by no more than tolerance
+    across any cell, or max_cases new cases have been evaluated. known is an
+    iterable of (case, value) of cases already evaluated, which are neither
+    re-evaluated nor returned
+    """
+    refinement = AdaptiveRefinement(axes, tolerance, initial=initial)
+    for case, value in known:
+        refinement.add(case, value)
+    return refinement.run(metric, max_cases=max_cases)
+
+
+def screen_metric(global_params={}, column="direct_gain_kwh", solar_cache=None):
+    """
+    a metric from the shading_screen estimate, column is a column of
+    shading_screen.screen_cases
+    """
+    from shading_models import ShadingModelInput
+    from shading_screen import screen_cases
+    from solar import SolarCache
+
+    base = ShadingModelInput(global_params).value
+    solar_cache = solar_cache or SolarCache()
+
+    def metric(cases):
+        full_cases = [ShadingModelInput(base | case).value for case in cases]
+        return screen_cases(full_cases, solar_cache=solar_cache)[column].tolist()
+
+    return metric
@@ -0,0 +1,219 @@
+import hashlib
+import json
+import os
+import pathlib
+import numpy as np
+
+from shading_models import ApertureParameters, ShadingModelInput
+
+"""
+Sensor grids for the working plane and each aperture, as numpy arrays of
+points and normals, built from the room, aperture and grid parameters.
+Only those fields define the grids, so in a sweep where most cases change
+shading or reflectances the grids repeat; GridCache builds and stores each
+unique grid once and hands the same (read only) arrays to every case.
+
+Geometry (as geometry_check): x along the room width, y along the depth and
+z up from the room origin at (x_offset, y_offset, height_above_ground_level).
+Face 0 is the +x wall and the faces go clockwise (seen from above) so face 1
+is -y, 2 is -x and 3 is +y. Apertures are centred on their wall plus
+aperture_offset (to the right seen from outside). Grid points are at the
+centres of the cells, with the cells centred on the surface.
+"""
+
+GRID_FIELDS = [
+    "room_width",
+    "room_depth",
+    "x_offset",
+    "y_offset",
+    "height_above_ground_level",
+    "working_plane_height",
+    "working_plane_grid_size",
+    "calc_surface_offset",
+    "window_grid_size",
+    "window_grid_offset_distance",
+]
+APERTURE_GRID_FIELDS = [
+    "room_face",
+    "frame_thickness",
+    "aperture_offset",
+    "aperture_width",
+    "sill_height",
+    "aperture_height",
+]
+DEFAULTS = ShadingModelInput().value
+APERTURE_DEFAULTS = ApertureParameters().model_dump()
+FACE_NORMALS = np.array([[1, 0, 0], [0, -1, 0], [-1, 0, 0], [0, 1, 0]], dtype=float)
+
+
+def grid_key(params: dict) -> tuple:
+    """
+    the fields that define the grids, as a hashable key
+    """
+    p = DEFAULTS | params
+    apertures = tuple(
+        tuple((APERTURE_DEFAULTS | aperture)[k] for k in APERTURE_GRID_FIELDS)
+        for aperture in p["apertures"]
+    )
+    return tuple(float(p[k]) for k in GRID_FIELDS) + (apertures,)
+
+
+def _cell_centres(length, size):
+    """
+    centres of the whole cells of size that fit in length, centred on it.
+    A size of 0 gives no cells
+    """
+    if size <= 0:
+        return np.zeros(0)
+    n = max(int(np.floor(length / size + 1e-9)), 1) if length > 0 else 0
+    return (np.arange(n) + 0.5) * size + (length - n * size) / 2
+
+
+def _surface_grid(origin, u, v, u_length, v_length, size, normal):
+    """
+    grid on the rectangle origin + [0, u_length] u + [0, v_length] v
+    """
+    a, b = np.meshgrid(
+        _cell_centres(u_length, size), _cell_centres(v_length, size), indexing="ij"
+    )
+    points = origin + a.reshape(-1, 1) * u + b.reshape(-1, 1) * v
+    normals = np.broadcast_to(normal, points.shape)
+    return points, normals
+
+
+def working_plane_grid(params: dict):
+    """
+    points and normals (n, 3) of the working plane, inset calc_surface_offset from the walls
+    """
+    p = DEFAULTS | params
+    inset = p["calc_surface_offset"]
+    origin = np.array(
+        [
+            p["x_offset"] + inset,
+            p["y_offset"] + inset,
+            p["height_above_ground_level"] + p["working_plane_height"],
+        ]
+    )
+    return _surface_grid(
+        origin,
+        np.array([1.0, 0, 0]),
+        np.array([0, 1.0, 0]),
+        p["room_width"] - 2 * inset,
+        p["room_depth"] - 2 * inset,
+        p["working_plane_grid_size"],
+        np.array([0, 0, 1.0]),
+    )
+
+
+def aperture_grids(params: dict) -> list:
+    """
+    points and normals (n, 3) over the glazing (inside the frame) of each
+    aperture, offset window_grid_offset_distance along the outward wall normal.
+    In the order of the apertures, as their names needn't be unique
+    """
+    p = DEFAULTS | params
+    room_origin = np.array(
+        [p["x_offset"], p["y_offset"], p["height_above_ground_level"]]
+    )
+    room_size = np.array([p["room_width"], p["room_depth"], 0])
+    z = np.array([0, 0, 1.0])
+    grids = []
+    for aperture in p["apertures"]:
+        aperture = APERTURE_DEFAULTS | aperture
+        normal = FACE_NORMALS[aperture["room_face"]]
+        u = np.cross(z, normal)  # to the right seen from outside
+        wall_centre = room_origin + room_size / 2 + normal * room_size / 2
+        frame = aperture["frame_thickness"]
+        glazing_width = aperture["aperture_width"] - 2 * frame
+        glazing_height = aperture["aperture_height"] - 2 * frame
+        origin = (
+            wall_centre
+            + (aperture["aperture_offset"] - glazing_width / 2) * u
+            + (aperture["sill_height"] + frame) * z
+            + p["window_grid_offset_distance"] * normal
+        )
+        grids.append(
+            _surface_grid(
+                origin,
+                u,
+                z,
+                glazing_width,
+                glazing_height,
+                p["window_grid_size"],
+                normal,
+            )
+        )
+    return grids
+
+
+def build_grids(params: dict) -> dict:
+    points, normals = working_plane_grid(params)
+    return {"working_plane": (points, normals), "apertures": aperture_grids(params)}
+
+
+def _read_only(grids):
+    for arrays in [grids["working_plane"], *grids["apertures"]]:
+        for array in arrays:
+            if array.flags.writeable:
+                array.flags.writeable = False
+    return grids
+
+
+class GridCache:
+    """
+    Builds the grids of each unique geometry once. If a folder is given each
+    unique grid is also saved there (as <key hash>.npz) and loaded by later runs
+    """
+
+    def __init__(self, folder=None):
+        self.folder = folder
+        self._grids = {}
+        self.hits = 0
+        self.misses = 0
+        if folder is not None:
+            pathlib.Path(folder).mkdir(parents=True, exist_ok=True)
+
+    def __len__(self):
+        return len(self._grids)
+
+    def _fpath(self, key):
+        key_hash = hashlib.sha256(json.dumps(key).encode("utf-8")).hexdigest()[:32]
+        return os.path.join(self.folder, key_hash + ".npz")
+
+    def _save(self, key, grids):
+        arrays = {
+            "working_plane_points": grids["working_plane"][0],
+            "working_plane_normals": grids["working_plane"][1],
+        }
+        for i, (points, normals) in enumerate(grids["apertures"]):
+            arrays[f"aperture_{i}_points"] = points
+            arrays[f"aperture_{i}_normals"] = normals
+        np.savez(self._fpath(key), **arrays)
+
+    def _load(self, key):
+        with np.load(self._fpath(key)) as f:
+            return {
+                "working_plane": (f["working_plane_points"], f["working_plane_normals"]),
+                "apertures": [
+                    (f[f"aperture_{i}_points"], f[f"aperture_{i}_normals"])
+                    for i in range(len(key[-1]))
+                ],
+            }
+
+    def get(self, params: dict) -> dict:
+        """
+        the grids for the case, shared with every case of the same geometry
+        """
+        key = grid_key(params)
+        if key in self._grids:
+            self.hits += 1
+            return self._grids[key]
+        self.misses += 1
+        if self.folder is not None and os.path.exists(self._fpath(key)):
+            grids = self._load(key)
+        else:
+            grids = build_grids(params)
+            if self.folder is not None:
+                self._save(key, grids)
+        self._grids[key] = _read_only(grids)
+        return self._grids[key]
@@ -0,0 +1,375 @@
+import argparse
+import json
+import math
+import pathlib
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+import numpy as np
+
+from shading_models import PARAMETER_SECTIONS, ShadingModelInput
+from shading_model_ui import ShadingModelInputUi
+from file_creation import (
+    folder_creation,
+    multi_parameter_variation,
+    save_json,
+    single_parameter_variation,
+)
+
+"""
+Benchmarks for the input file generation. Run with `python benchmark.py`,
+see `python benchmark.py --help` for the suite options.
+
+The suite times each stage of the pipeline at several case counts in a
+temporary directory, reporting the time per case, the peak (python) memory
+from a second run under tracemalloc and the file system calls made (counted
+by an audit hook). Results are saved as json and can be compared against a
+saved baseline to flag regressions.
+"""
+
+# import time budgets (s) of the modules batch workers import, and the heavy
+# packages they must not import
+IMPORT_BUDGETS = {"shading_models": 0.5, "file_creation": 0.6}
+HEAVY_MODULES = ["numpy", "pandas", "ipywidgets", "ipyautoui"]
+_IMPORT_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps([elapsed, [m for m in {heavy} if m in sys.modules]]))
+"""
+
+
+SUITE_SIZES = [10, 1000, 100000]
+# the value set in the value set benchmarks, keys from most sections
+MANY_KEYS = {
+    "timestep": 2,
+    "room_width": 4.0,
+    "room_depth": 6.0,
+    "glazing_g_value": 0.5,
+    "toggle_overhang": True,
+    "overhang_depth": 1.0,
+    "toggle_louvre_creation": True,
+    "blade_depth": 0.2,
+    "number_of_shades": 5,
+    "toggle_blind": True,
+    "blind_percentage_cover": 50.0,
+    "toggle_external_vertical_fin": True,
+    "vertical_fin_depth": 0.5,
+    "toggle_ground_plane": True,
+}
+FS_EVENTS = {
+    "open": "open",
+    "os.mkdir": "mkdir",
+    "os.rename": "rename",
+    "os.remove": "remove",
+    "os.listdir": "listdir",
+    "os.scandir": "listdir",
+}
+_fs_counts = None
+_audit_hook_added = False
+
+
+def _count_fs_ops(event, args):
+    if _fs_counts is not None and event in FS_EVENTS:
+        op = FS_EVENTS[event]
+        if op == "open" and isinstance(args[1], str) and "r" not in args[1]:
+            op = "open_write"
+        _fs_counts[op] = _fs_counts.get(op, 0) + 1
+
+
+def _bench_ui_build(n, folder):
+    for _ in range(n):
+        ShadingModelInputUi()
+
+
+def _bench_ui_full_build(n, folder):
+    for _ in range(n):
+        ShadingModelInputUi(open_sections=PARAMETER_SECTIONS)
+
+
+def _set_many(ui, n):
+    changed = dict(MANY_KEYS)
+    defaults = {k: ui.value[k] for k in MANY_KEYS}
+    for i in range(n):
+        ui.value = changed if i % 2 == 0 else defaults
+        ui.value
+
+
+def _bench_ui_value_set(n, folder):
+    # most of MANY_KEYS are in sections that aren't built, so validated headless
+    _set_many(ShadingModelInputUi(), n)
+
+
+def _bench_ui_full_value_set(n, folder):
+    # every section built, so every key is set through the widgets
+    _set_many(ShadingModelInputUi(open_sections=PARAMETER_SECTIONS), n)
+
+
+def _bench_headless_value_set(n, folder):
+    _set_many(ShadingModelInput(), n)
+
+
+def _bench_save_json(n, folder):
+    value = ShadingModelInput().value
+    for i in range(n):
+        save_json(value, f"case_{i}", folder)
+
+
+def _bench_single_parameter_variation(n, folder):
+    single_parameter_variation(folder, "overhang_depth", 0.0, n - 1, 1.0, {})
+
+
+def _bench_parameter_variation(n, folder, max_workers=None):
+    side = math.isqrt(n)
+    axes = {
+        "overhang_depth": [float(i) for i in range(side)],
+        "blade_depth": [float(i) for i in range(n // side)],
+    }
+    for _ in multi_parameter_variation(
+        folder, axes, {}, max_workers=max_workers, progress=None
+    ):
+        pass
+    return side * (n // side)
+
+
+def _bench_bulk_parameter_variation(n, folder):
+    return _bench_parameter_variation(n, folder, max_workers=8)
+
+
+# name: (function(n, folder) returning the number of cases if not n, the
+# largest n it is run at)
+BENCHMARKS = {
+    "ui_build": (_bench_ui_build, 100),
+    "ui_full_build": (_bench_ui_full_build, 100),
+    "ui_value_set": (_bench_ui_value_set, 1000),
+    "ui_full_value_set": (_bench_ui_full_value_set, 1000),
+    "headless_value_set": (_bench_headless_value_set, 100000),
+    "save_json": (_bench_save_json, 100000),
+    "single_parameter_variation": (_bench_single_parameter_variation, 100000),
+    "parameter_variation": (_bench_parameter_variation, 100000),
+    "bulk_parameter_variation": (_bench_bulk_parameter_variation, 100000),
+}
+
+
+def run_benchmark(name, n, memory=True) -> dict:
+    """
+    runs one benchmark at (about) n cases in a temporary directory
+    """
+    global _fs_counts, _audit_hook_added
+    if not _audit_hook_added:
+        # audit hooks can't be removed, it only counts while _fs_counts is set
+        sys.addaudithook(_count_fs_ops)
+        _audit_hook_added = True
+    function = BENCHMARKS[name][0]
+    with tempfile.TemporaryDirectory() as tmp:
+        # warm up, so lazy imports and first-use caches aren't timed
+        function(1, pathlib.Path(tmp))
+    with tempfile.TemporaryDirectory() as tmp:
+        folder = pathlib.Path(tmp) / "timed"
+        folder.mkdir()
+        _fs_counts = {}
+        start = time.perf_counter()
+        try:
+            n = function(n, folder) or n
+        finally:
+            seconds = time.perf_counter() - start
+            fs_ops, _fs_counts = _fs_counts, None
+    peak = None
+    if memory:
+        with tempfile.TemporaryDirectory() as tmp:
+            folder = pathlib.Path(tmp) / "traced"
+            folder.mkdir()
+            tracemalloc.start()
+            try:
+                function(n, folder)
+                peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+    return dict(
+        benchmark=name,
+        n_cases=n,
+        seconds=seconds,
+        seconds_per_case=seconds / n,
+        peak_memory_mb=peak / 2**20 if peak is not None else None,
+        fs_ops=fs_ops,
+    )
+
+
+def run_suite(names=None, sizes=SUITE_SIZES, memory=True, progress=print) -> dict:
+    """
+    runs each benchmark at each size up to its largest. Returns the machine
+    details and a list of results
+    """
+    results = []
+    for name in names or BENCHMARKS:
+        for n in sizes:
+            if n > BENCHMARKS[name][1]:
+                continue
+            result = run_benchmark(name, n, memory=memory)
+            results.append(result)
+            if progress:
+                progress(format_result(result))
+    return dict(
+        python=sys.version.split()[0],
+        platform=platform.platform(),
+        time=time.strftime("%Y-%m-%dT%H:%M:%S"),
+        results=results,
+    )
+
+
+def format_result(result) -> str:
+    memory = result["peak_memory_mb"]
+    memory = f"{memory:8.1f} MB" if memory is not None else "       - MB"
+    return (
+        f"{result['benchmark']:<28}{result['n_cases']:>8} cases"
+        f"{result['seconds_per_case'] * 1e3:>10.3f} ms/case{memory}"
+        f"  fs ops/case {sum(result['fs_ops'].values()) / result['n_cases']:.1f}"
+    )
+
+
+def compare_to_baseline(suite, baseline, tolerance=0.25) -> list:
+    """
+    the regressions against a baseline suite run, as messages: the time per
+    case or peak memory more than tolerance (fraction) worse, or more file
+    system calls per case
+    """
+    baseline_results = {
+        (r["benchmark"], r["n_cases"]): r for r in baseline["results"]
+    }
+    regressions = []
+    for result in suite["results"]:
+        key = (result["benchmark"], result["n_cases"])
+        if key not in baseline_results:
+            continue
+        base = baseline_results[key]
+        label = f"{key[0]} at {key[1]} cases"
+        if result["seconds_per_case"] > base["seconds_per_case"] * (1 + tolerance):
+            regressions.append(
+                f"{label}: {result['seconds_per_case'] * 1e3:.3f} ms/case, "
+                f"baseline {base['seconds_per_case'] * 1e3:.3f}"
+            )
+        if (
+            result["peak_memory_mb"] is not None
+            and base["peak_memory_mb"] is not None
+            and result["peak_memory_mb"] > base["peak_memory_mb"] * (1 + tolerance)
+        ):
+            regressions.append(
+                f"{label}: {result['peak_memory_mb']:.1f} MB peak, "
+                f"baseline {base['peak_memory_mb']:.1f}"
+            )
+        if sum(result["fs_ops"].values()) > sum(base["fs_ops"].values()):
+            regressions.append(
+                f"{label}: {result['fs_ops']} file system calls, baseline {base['fs_ops']}"
+            )
+    return regressions
+
+
+def _sweep_files(ui, parent_folder, parameter_name, param_array):
+    for param_val in param_array:
+        ui.value = {parameter_name: param_val}
+        folder_creation(parent_folder, str(uuid.uuid4()), ui.value)
+
+
+def bench_headless_vs_widget(
+    n_cases=200, parameter_name="overhang_depth", start_value=0.0, end_value=2.0
+):
+    """
+    times the generation of n_cases files using the widget ui (with every
+    section built, so each value goes through the widgets) and the headless
+    model and returns the time per file (s) for each
+    """
+    param_array = np.linspace(start_value, end_value, n_cases).round(decimals=3)
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, make_ui in [
+            ("widget", lambda: ShadingModelInputUi(open_sections=PARAMETER_SECTIONS)),
+            ("headless", ShadingModelInput),
+        ]:
+            parent_folder = pathlib.Path(tmp) / name
+            start = time.perf_counter()
+            ui = make_ui()
+            _sweep_files(ui, parent_folder, parameter_name, param_array)
+            results[name] = (time.perf_counter() - start) / n_cases
+    results["speed_up"] = results["widget"] / results["headless"]
+    return results
+
+
+def bench_import_time(modules=tuple(IMPORT_BUDGETS), repeat=3):
+    """
+    the best of repeat import times (s) of each module in a fresh interpreter,
+    and the heavy packages it imported
+    """
+    results = {}
+    for module in modules:
+        script = _IMPORT_SCRIPT.format(module=module, heavy=HEAVY_MODULES)
+        runs = [
+            json.loads(
+                subprocess.run(
+                    [sys.executable, "-c", script],
+                    capture_output=True,
+                    text=True,
+                    check=True,
+                    cwd=pathlib.Path(__file__).parent,
+                ).stdout.splitlines()[-1]
+            )
+            for _ in range(repeat)
+        ]
+        results[module] = {"seconds": min(r[0] for r in runs), "heavy": runs[0][1]}
+    return results
+
+
+def check_import_time(results):
+    """
+    the import time regressions, as messages
+    """
+    failures = []
+    for module, result in results.items():
+        if module not in IMPORT_BUDGETS:
+            continue
+        if result["seconds"] > IMPORT_BUDGETS[module]:
+            failures.append(
+                f"{module} took {result['seconds']:.3f}s to import, budget {IMPORT_BUDGETS[module]}s"
+            )
+        if result["heavy"]:
+            failures.append(f"{module} imports {result['heavy']}")
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--suite", action="store_true", help="run the benchmark suite")
+    parser.add_argument("--benchmarks", nargs="+", choices=list(BENCHMARKS))
+    parser.add_argument("--sizes", nargs="+", type=int, default=SUITE_SIZES)
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc runs")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--baseline", help="suite results json to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+
+    if args.suite:
+        suite = run_suite(args.benchmarks, args.sizes, memory=not args.no_memory)
+        with open(args.output, "w") as f:
+            json.dump(suite, f, indent=4)
+        print(f"saved {args.output}")
+        if args.baseline:
+            with open(args.baseline) as f:
+                regressions = compare_to_baseline(suite, json.load(f), args.tolerance)
+            for regression in regressions:
+                print(f"REGRESSION: {regression}")
+            sys.exit(1 if regressions else 0)
+        sys.exit(0)
+
+    imports = bench_import_time(list(IMPORT_BUDGETS) + ["shading_model_ui"])
+    for module, result in imports.items():
+        print(f"import {module}: {result['seconds'] * 1e3:.0f} ms")
+    for failure in check_import_time(imports):
+        print(f"REGRESSION: {failure}")
+    results = bench_headless_vs_widget()
+    print(f"widget:   {results['widget'] * 1e3:.3f} ms/file")
+    print(f"headless: {results['headless'] * 1e3:.3f} ms/file")
+    print(f"speed up: {results['speed_up']:.1f}x")
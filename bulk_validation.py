@@ -0,0 +1,171 @@
+import functools
+import itertools
+import operator
+import annotated_types as at
+import numpy as np
+import pandas as pd
+
+from shading_models import FIELD_SECTIONS, PARAMETER_SECTIONS, ShadingModelInput, schema_limits
+
+"""
+Vectorised validation of whole sweep designs. The Field constraints of the
+pydantic models are compiled into numpy/pandas column checks so a DataFrame
+of candidate cases (one row per case, one column per parameter) is checked in
+one pass rather than by building a model per case.
+
+As well as the pydantic constraints (ge, le, gt, lt) the `enum` and `max`
+given in the json schema (which the widgets enforce) are checked, as is the
+check_dates validator of SimulationParameters. apertures is not checked.
+"""
+
+DAYS_IN_MONTH = np.array([31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31])
+DATE_FIELDS = [
+    ("start_month", "start_day"),
+    ("end_month", "end_day"),
+]
+
+BOUNDS = [
+    (at.Ge, "ge", operator.ge, ">="),
+    (at.Gt, "gt", operator.gt, ">"),
+    (at.Le, "le", operator.le, "<="),
+    (at.Lt, "lt", operator.lt, "<"),
+]
+
+
+def _field_checks(name, field) -> list:
+    """
+    returns [(reason, check)] where check(column, values) gives a bool array of
+    the valid rows, values being the column as a float array
+    """
+    checks = []
+    if field.annotation is bool:
+        checks.append(
+            (
+                f"{name}: must be a bool",
+                lambda c, values: c.isin([True, False]).to_numpy(),
+            )
+        )
+        return checks
+    if field.annotation not in (int, float):
+        return checks
+
+    checks.append((f"{name}: must be a number", lambda c, values: ~np.isnan(values)))
+    if field.annotation is int:
+        checks.append(
+            (f"{name}: must be an integer", lambda c, values: np.mod(values, 1) == 0)
+        )
+    for constraint in field.metadata:
+        for constraint_type, attr, op, symbol in BOUNDS:
+            if isinstance(constraint, constraint_type):
+                bound = getattr(constraint, attr)
+                checks.append(
+                    (
+                        f"{name}: must be {symbol} {bound}",
+                        lambda c, values, op=op, bound=bound: op(values, bound),
+                    )
+                )
+    extra = schema_limits(field)
+    if "max" in extra:
+        checks.append(
+            (
+                f"{name}: must be <= {extra['max']}",
+                lambda c, values, bound=extra["max"]: values <= bound,
+            )
+        )
+    if "enum" in extra:
+        checks.append(
+            (
+                f"{name}: must be one of {extra['enum']}",
+                lambda c, values, enum=extra["enum"]: np.isin(values, enum),
+            )
+        )
+    return checks
+
+
+@functools.cache
+def compile_checks() -> dict:
+    """
+    the column checks for every field of the models, {field: [(reason, check)]}
+    """
+    return {
+        name: _field_checks(name, field)
+        for model in PARAMETER_SECTIONS.values()
+        for name, field in model.model_fields.items()
+    }
+
+
+def _numeric(column):
+    return pd.to_numeric(column, errors="coerce").to_numpy(dtype=float)
+
+
+def _date_check(df, month_field, day_field):
+    month = _numeric(df[month_field])
+    day = _numeric(df[day_field])
+    month_index = np.clip(np.nan_to_num(month, nan=1), 1, 12).astype(int) - 1
+    return (day >= 1) & (day <= DAYS_IN_MONTH[month_index])
+
+
+def validate_frame(df: pd.DataFrame) -> tuple[np.ndarray, pd.Series]:
+    """
+    checks every row of df against the model constraints in one pass.
+    Returns a bool mask of the valid rows and a Series (indexed as df, invalid
+    rows only) of the list of reasons each invalid row failed
+    """
+    for name in df.columns:
+        if name not in FIELD_SECTIONS:
+            raise ValueError(f"'{name}' does not exist")
+    checks = compile_checks()
+    reasons = []
+    results = []
+    for name in df.columns:
+        if not checks[name]:
+            continue
+        column = df[name]
+        values = _numeric(column)
+        for reason, check in checks[name]:
+            reasons.append(reason)
+            results.append(check(column, values))
+    for month_field, day_field in DATE_FIELDS:
+        if month_field in df.columns or day_field in df.columns:
+            date_df = df.reindex(columns=[month_field, day_field])
+            defaults = ShadingModelInput.default_value("simulation_params")
+            date_df = date_df.fillna(
+                {month_field: defaults[month_field], day_field: defaults[day_field]}
+            )
+            reasons.append(f"{day_field}: day is out of range for month")
+            results.append(_date_check(date_df, month_field, day_field))
+
+    if not results:
+        return np.ones(len(df), dtype=bool), pd.Series([], dtype=object)
+    valid = np.column_stack(results)
+    mask = valid.all(axis=1)
+    invalid_rows = np.flatnonzero(~mask)
+    errors = pd.Series(
+        [[reasons[i] for i in np.flatnonzero(~valid[row])] for row in invalid_rows],
+        index=df.index[invalid_rows],
+        dtype=object,
+    )
+    return mask, errors
+
+
+def valid_cases(cases, global_params={}, chunk_size=10000, on_invalid=None):
+    """
+    filters an iterable of case dicts (e.g. from sweep.sweep_cases), validating
+    chunk_size cases at a time merged over the scalar global_params.
+    on_invalid(case, reasons) is called for each case that is dropped
+    """
+    scalar_params = {
+        k: v for k, v in global_params.items() if not isinstance(v, (list, dict))
+    }
+    cases = iter(cases)
+    while chunk := list(itertools.islice(cases, chunk_size)):
+        df = pd.DataFrame([scalar_params | case for case in chunk])
+        df = df.drop(columns=[c for c in df.columns if c == "apertures"])
+        mask, errors = validate_frame(df)
+        for case, is_valid, reasons in zip(
+            chunk, mask, errors.reindex(df.index).tolist()
+        ):
+            if is_valid:
+                yield case
+            elif on_invalid is not None:
+                on_invalid(case, reasons)
@@ -0,0 +1,222 @@
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import time
+import numpy as np
+
+from shading_models import PARAMETER_SECTIONS, ApertureParameters, ShadingModelInput
+
+"""
+Content addressed case ids and a local index of cases that already exist, so
+that rerunning an identical sweep reuses the existing inputs and results.
+"""
+
+SIGNIFICANT_FIGURES = 10
+CASE_ID_LENGTH = 32
+# fields hashed as floats even if given as ints
+FLOAT_FIELDS = {
+    name
+    for model in [*PARAMETER_SECTIONS.values(), ApertureParameters]
+    for name, field in model.model_fields.items()
+    if field.annotation is float
+}
+
+
+def _normalise(value, name=None):
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, int) and name in FLOAT_FIELDS:
+        value = float(value)
+    if isinstance(value, float):
+        value = float(f"{value:.{SIGNIFICANT_FIGURES}g}")
+        return 0.0 if value == 0 else value
+    if isinstance(value, dict):
+        return {k: _normalise(v, k) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalise(v) for v in value]
+    return value
+
+
+def case_hash(params: dict, validate=True) -> str:
+    """
+    canonical hash of a parameter set. With validate the params are first
+    merged with the defaults and validated, so partial and full dicts that
+    describe the same case give the same hash
+    """
+    if validate:
+        params = ShadingModelInput(params).value
+    canonical = json.dumps(
+        _normalise(params), sort_keys=True, separators=(",", ":"), allow_nan=False
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:CASE_ID_LENGTH]
+
+
+def folder_size(fpath) -> int:
+    """
+    total size in bytes of the files in a folder
+    """
+    size = 0
+    for root, _, files in os.walk(fpath):
+        for f in files:
+            size += os.path.getsize(os.path.join(root, f))
+    return size
+
+
+class CaseIndex:
+    """
+    Local sqlite index of case_id -> case folder and results file.
+    Keep the index file on local disk, not on the share.
+    """
+
+    def __init__(self, index_filepath, commit_every=1000):
+        self.index_filepath = index_filepath
+        self.commit_every = commit_every
+        self._n_pending = 0
+        self._conn = sqlite3.connect(index_filepath, check_same_thread=False)
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS cases (
+                case_id TEXT PRIMARY KEY,
+                case_folder TEXT NOT NULL,
+                input_filepath TEXT,
+                results_filepath TEXT,
+                created REAL NOT NULL,
+                last_used REAL NOT NULL,
+                size INTEGER NOT NULL DEFAULT 0
+            )"""
+        )
+        self._conn.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return self._conn.execute("SELECT COUNT(*) FROM cases").fetchone()[0]
+
+    def __contains__(self, case_id):
+        return self.lookup(case_id, touch=False) is not None
+
+    def _changed(self):
+        self._n_pending += 1
+        if self._n_pending >= self.commit_every:
+            self.flush()
+
+    def flush(self):
+        self._conn.commit()
+        self._n_pending = 0
+
+    def close(self):
+        self.flush()
+        self._conn.close()
+
+    def lookup(self, case_id, touch=True) -> dict | None:
+        """
+        returns the index entry for case_id, or None if it isn't indexed
+        """
+        cursor = self._conn.execute("SELECT * FROM cases WHERE case_id = ?", (case_id,))
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        if touch:
+            self._conn.execute(
+                "UPDATE cases SET last_used = ? WHERE case_id = ?", (time.time(), case_id)
+            )
+            self._changed()
+        return dict(zip([c[0] for c in cursor.description], row))
+
+    def add(self, case_id, case_folder, input_filepath=None, results_filepath=None):
+        now = time.time()
+        self._conn.execute(
+            """INSERT OR REPLACE INTO cases
+            (case_id, case_folder, input_filepath, results_filepath, created, last_used, size)
+            VALUES (?, ?, ?, ?, ?, ?, ?)""",
+            (
+                case_id,
+                str(case_folder),
+                None if input_filepath is None else str(input_filepath),
+                None if results_filepath is None else str(results_filepath),
+                now,
+                now,
+                folder_size(case_folder) if results_filepath else 0,
+            ),
+        )
+        self._changed()
+
+    def set_size(self, case_id, size):
+        """
+        records the size in bytes of a case folder, e.g. once its input is written
+        """
+        self._conn.execute("UPDATE cases SET size = ? WHERE case_id = ?", (size, case_id))
+        self._changed()
+
+    def set_results(self, case_id, results_filepath):
+        """
+        records the results file of a case once it has been simulated
+        """
+        entry = self.lookup(case_id, touch=False)
+        if entry is None:
+            raise ValueError(f"'{case_id}' does not exist")
+        self._conn.execute(
+            "UPDATE cases SET results_filepath = ?, size = ?, last_used = ? WHERE case_id = ?",
+            (
+                str(results_filepath),
+                folder_size(entry["case_folder"]),
+                time.time(),
+                case_id,
+            ),
+        )
+        self._changed()
+
+    def prune_missing(self) -> list[str]:
+        """
+        removes entries whose case folder no longer exists
+        """
+        rows = self._conn.execute("SELECT case_id, case_folder FROM cases").fetchall()
+        missing = [case_id for case_id, fpath in rows if not os.path.isdir(fpath)]
+        self._remove(missing, delete_files=False)
+        return missing
+
+    def _remove(self, case_ids, delete_files):
+        for case_id in case_ids:
+            if delete_files:
+                entry = self.lookup(case_id, touch=False)
+                shutil.rmtree(entry["case_folder"], ignore_errors=True)
+            self._conn.execute("DELETE FROM cases WHERE case_id = ?", (case_id,))
+        self.flush()
+
+    def evict(self, max_age_days=None, max_total_bytes=None, delete_files=False):
+        """
+        removes entries not used for max_age_days, then the least recently used
+        until the total size is under max_total_bytes. With delete_files the
+        case folders are deleted too. Returns the evicted case ids
+        """
+        evicted = []
+        if max_age_days is not None:
+            cutoff = time.time() - max_age_days * 86400
+            evicted += [
+                row[0]
+                for row in self._conn.execute(
+                    "SELECT case_id FROM cases WHERE last_used < ?", (cutoff,)
+                )
+            ]
+            self._remove(evicted, delete_files)
+        if max_total_bytes is not None:
+            rows = self._conn.execute(
+                "SELECT case_id, size FROM cases ORDER BY last_used"
+            ).fetchall()
+            total = sum(size for _, size in rows)
+            by_size = []
+            for case_id, size in rows:
+                if total <= max_total_bytes:
+                    break
+                by_size.append(case_id)
+                total -= size
+            self._remove(by_size, delete_files)
+            evicted += by_size
+        return evicted
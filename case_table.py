@@ -0,0 +1,139 @@
+import pathlib
+import uuid
+import typing as ty
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from shading_models import PARAMETER_SECTIONS
+
+"""
+Stores a whole sweep as a single columnar table (one row per case) instead of
+a folder and json file per case. Files ending .parquet are written as parquet,
+anything else (e.g. .arrow) as an arrow ipc file which can be memory mapped.
+"""
+
+NAME_COLUMN = "case_name"
+
+ARROW_TYPES = {
+    bool: pa.bool_(),
+    int: pa.int64(),
+    float: pa.float64(),
+    str: pa.string(),
+}
+
+
+def _model_fields(model) -> list[pa.Field]:
+    fields = []
+    for name, field in model.model_fields.items():
+        if ty.get_origin(field.annotation) is list:
+            (item_model,) = ty.get_args(field.annotation)
+            arrow_type = pa.list_(pa.struct(_model_fields(item_model)))
+        else:
+            arrow_type = ARROW_TYPES[field.annotation]
+        fields.append(pa.field(name, arrow_type))
+    return fields
+
+
+def case_table_schema() -> pa.Schema:
+    """
+    one column per key of ShadingModelInputUi.value, apertures as a list of structs
+    """
+    fields = [pa.field(NAME_COLUMN, pa.string())]
+    for model in PARAMETER_SECTIONS.values():
+        fields += _model_fields(model)
+    return pa.schema(fields)
+
+
+def _is_parquet(filepath):
+    return pathlib.Path(filepath).suffix == ".parquet"
+
+
+def write_case_table(filepath, input_json_datas, names=None, chunk_size=10000):
+    """
+    writes each parameter dict as a row of a single table, chunk_size rows at a
+    time so the sweep is never held in memory. Cases are named with a uuid
+    unless names are given. Returns the number of cases written
+    """
+    schema = case_table_schema()
+    names = iter(names) if names is not None else None
+    if _is_parquet(filepath):
+        writer = pq.ParquetWriter(filepath, schema)
+    else:
+        writer = pa.ipc.new_file(filepath, schema)
+    n_cases = 0
+    rows = []
+    with writer:
+        for input_json_data in input_json_datas:
+            name = next(names) if names is not None else str(uuid.uuid4())
+            rows.append({NAME_COLUMN: name} | input_json_data)
+            if len(rows) == chunk_size:
+                writer.write_batch(pa.RecordBatch.from_pylist(rows, schema=schema))
+                n_cases += len(rows)
+                rows = []
+        if rows:
+            writer.write_batch(pa.RecordBatch.from_pylist(rows, schema=schema))
+            n_cases += len(rows)
+    return n_cases
+
+
+class CaseTable:
+    """
+    Reads a table written by write_case_table. The file is memory mapped and
+    single cases are pulled out as the same dict that ShadingModelInputUi.value gives
+    """
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self._index = None
+        if _is_parquet(filepath):
+            self._parquet = pq.ParquetFile(filepath, memory_map=True)
+            self._table = None
+            sizes = [
+                self._parquet.metadata.row_group(i).num_rows
+                for i in range(self._parquet.num_row_groups)
+            ]
+            self._row_group_starts = [sum(sizes[:i]) for i in range(len(sizes))]
+            self._num_rows = sum(sizes)
+            self._row_group = (None, None)
+        else:
+            self._parquet = None
+            source = pa.memory_map(str(filepath), "r")
+            self._table = pa.ipc.open_file(source).read_all()
+            self._num_rows = self._table.num_rows
+
+    def __len__(self):
+        return self._num_rows
+
+    def _row(self, i) -> dict:
+        if self._table is not None:
+            return self._table.slice(i, 1).to_pylist()[0]
+        group = max(g for g, start in enumerate(self._row_group_starts) if start <= i)
+        if self._row_group[0] != group:
+            self._row_group = (group, self._parquet.read_row_group(group))
+        row_group = self._row_group[1]
+        return row_group.slice(i - self._row_group_starts[group], 1).to_pylist()[0]
+
+    def __getitem__(self, i) -> dict:
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(f"case {i} out of range")
+        row = self._row(i)
+        del row[NAME_COLUMN]
+        return row
+
+    @property
+    def names(self) -> list[str]:
+        if self._table is not None:
+            return self._table.column(NAME_COLUMN).to_pylist()
+        return self._parquet.read(columns=[NAME_COLUMN]).column(0).to_pylist()
+
+    def case(self, name) -> dict:
+        """
+        returns the parameter dict of the named case
+        """
+        if self._index is None:
+            self._index = {n: i for i, n in enumerate(self.names)}
+        if name not in self._index:
+            raise ValueError(f"'{name}' does not exist")
+        return self[self._index[name]]
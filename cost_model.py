@@ -0,0 +1,174 @@
+import functools
+import heapq
+import os
+import numpy as np
+
+from analysis_grid import APERTURE_DEFAULTS, DEFAULTS, _cell_centres
+from file_creation import read_json, save_json
+from timeseries_store import PERIOD_FIELDS, analysis_period_hoys
+
+"""
+Relative runtime estimates for cases, for ordering and packing the cases of
+a sweep. A case's cost is the sum over its enabled calcs of a weight (per
+calc and radiance_parameters_detail_level) times the work of the calc: the
+number of sensor points, times the number of time steps for the time series
+calcs, plus a fixed setup cost. The weights start from rough priors and are
+fitted to recorded runtimes (e.g. those in the scheduler's queue file),
+minimising the relative error with a ridge penalty towards the priors so
+calcs with few recorded runs keep sensible weights.
+"""
+
+CALCS = {
+    # calc toggle: (grid, time series)
+    "run_df_calc": ("working_plane", False),
+    "run_BSEN17037_calc": ("window", True),
+    "run_climate_based_dl_model": ("working_plane", True),
+    "run_irradiance_calc": ("window", True),
+}
+DETAIL_LEVELS = [0, 1, 2]
+PRIOR_WEIGHTS = {
+    "setup": 10.0,
+    "run_df_calc": 50.0,
+    "run_BSEN17037_calc": 1.0,
+    "run_climate_based_dl_model": 1.0,
+    "run_irradiance_calc": 1.0,
+}
+PRIOR_DETAIL_FACTORS = [1.0, 4.0, 16.0]
+ORDERS = ["longest_first", "cheapest_first"]
+
+
+@functools.lru_cache(maxsize=None)
+def _n_steps(period: tuple) -> int:
+    return len(analysis_period_hoys(dict(zip(PERIOD_FIELDS, period))))
+
+
+def grid_sizes(params: dict) -> dict:
+    """
+    number of working plane and window sensor points, as analysis_grid builds them
+    """
+    p = DEFAULTS | params
+    inset = 2 * p["calc_surface_offset"]
+    working_plane = len(
+        _cell_centres(p["room_width"] - inset, p["working_plane_grid_size"])
+    ) * len(_cell_centres(p["room_depth"] - inset, p["working_plane_grid_size"]))
+    window = 0
+    for aperture in p["apertures"]:
+        aperture = APERTURE_DEFAULTS | aperture
+        frame = 2 * aperture["frame_thickness"]
+        window += len(
+            _cell_centres(aperture["aperture_width"] - frame, p["window_grid_size"])
+        ) * len(_cell_centres(aperture["aperture_height"] - frame, p["window_grid_size"]))
+    return {"working_plane": working_plane, "window": window}
+
+
+class CostModel:
+    """
+    weights has a "setup" weight and one per "<calc>_<detail level>"
+    """
+
+    def __init__(self, weights=None, ridge=1.0):
+        self.terms = ["setup"] + [f"{calc}_{level}" for calc in CALCS for level in DETAIL_LEVELS]
+        self.prior = np.array(
+            [PRIOR_WEIGHTS["setup"]]
+            + [
+                PRIOR_WEIGHTS[calc] * PRIOR_DETAIL_FACTORS[level]
+                for calc in CALCS
+                for level in DETAIL_LEVELS
+            ]
+        )
+        self.weights = self.prior.copy()
+        if weights is not None:
+            self.weights = np.array([weights[term] for term in self.terms], dtype=float)
+        self.ridge = ridge
+
+    def features(self, params: dict) -> np.ndarray:
+        """
+        the work of each term of the case
+        """
+        p = DEFAULTS | params
+        sizes = grid_sizes(p)
+        n_steps = _n_steps(tuple(p[k] for k in PERIOD_FIELDS))
+        x = np.zeros(len(self.terms))
+        x[0] = 1
+        for calc, (grid, time_series) in CALCS.items():
+            if p[calc]:
+                term = self.terms.index(f"{calc}_{p['radiance_parameters_detail_level']}")
+                x[term] = sizes[grid] * (n_steps if time_series else 1)
+        return x
+
+    def feature_matrix(self, cases) -> np.ndarray:
+        return np.array([self.features(params) for params in cases]).reshape(-1, len(self.terms))
+
+    def estimate(self, cases) -> np.ndarray:
+        """
+        relative runtime of each case (in seconds once fitted)
+        """
+        return self.feature_matrix(cases) @ self.weights
+
+    def fit(self, cases, runtimes):
+        """
+        fits the weights to the recorded runtimes (seconds) of cases
+        """
+        x = self.feature_matrix(cases)
+        y = np.asarray(runtimes, dtype=float)
+        keep = y > 0
+        x, y = x[keep], y[keep]
+        if not len(y):
+            return self
+        # priors scaled to seconds, then a relative correction of each weight
+        prior = self.prior * np.median(y / (x @ self.prior))
+        a = x * prior / y[:, None]
+        used = a.any(axis=0)
+        lhs = a.T @ a + self.ridge * np.eye(len(prior))
+        rhs = a.T @ np.ones(len(y)) + self.ridge
+        correction = np.linalg.solve(lhs, rhs).clip(min=0.01)
+        self.weights = prior * np.where(used, correction, 1)
+        return self
+
+    def fit_queue(self, queue):
+        """
+        fits the weights to the runtimes of the cases a scheduler.JobQueue
+        recorded as done
+        """
+        cases, runtimes = [], []
+        for record in queue.records("done"):
+            if os.path.exists(record.get("input_filepath", "")):
+                cases.append(read_json(record["input_filepath"]))
+                runtimes.append(record["elapsed"])
+        return self.fit(cases, runtimes)
+
+    def save(self, filepath):
+        name, fdir = os.path.splitext(os.path.basename(filepath))[0], os.path.dirname(filepath)
+        return save_json(dict(zip(self.terms, self.weights.tolist())), name, fdir)
+
+    @classmethod
+    def load(cls, filepath, ridge=1.0):
+        return cls(read_json(filepath), ridge=ridge)
+
+
+def order_cases(cases, costs, order="longest_first") -> list:
+    """
+    cases sorted by cost, longest first (shortens the overall runtime on a
+    pool of workers) or cheapest first (gets results back soonest)
+    """
+    if order not in ORDERS:
+        raise ValueError(f"order must be one of {ORDERS}")
+    ranked = np.argsort(np.asarray(costs), kind="stable")
+    if order == "longest_first":
+        ranked = ranked[::-1]
+    cases = list(cases)
+    return [cases[i] for i in ranked]
+
+
+def bin_pack(costs, n_bins) -> list[list[int]]:
+    """
+    splits the cases (by index) into n_bins of about equal total cost, e.g.
+    one per machine, largest first onto the least loaded bin
+    """
+    bins = [(0.0, i, []) for i in range(n_bins)]
+    heapq.heapify(bins)
+    for i in np.argsort(np.asarray(costs), kind="stable")[::-1]:
+        total, b, indexes = heapq.heappop(bins)
+        indexes.append(int(i))
+        heapq.heappush(bins, (total + costs[i], b, indexes))
+    return [indexes for _, _, indexes in sorted(bins, key=lambda b: b[1])]
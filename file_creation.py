@@ -1,39 +1,66 @@
-from pydantic import BaseModel, Field, PositiveFloat, model_validator
-from ipyautoui.autoobject import AutoObject
-
 import pathlib
-import json
 import os
-import sys
-import ipywidgets as w
 import uuid
-import datetime
 import pathlib
-import typing as ty
-import numpy as np
-from enum import Enum
-from collections import OrderedDict
-import pandas as pd
+import time
+import itertools
+import collections
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
 
-from shading_model_ui import ShadingModelInputUi
+import profiling
+import serializers
+from shading_models import ShadingModelInput
 
 """
-This set of functions is to create and save a json file with the parameters for the shading model
+This set of functions is to create and save a json file with the parameters for the shading model.
+Only the models are imported up front (numpy, pandas and the widgets are
+imported when first needed) so batch workers start quickly.
 """
 
 
-def save_json(json_data: dict, name: str, fdir=pathlib.Path(".").parent):
+def __getattr__(name):
+    if name == "ShadingModelInputUi":
+        from shading_model_ui import ShadingModelInputUi
+
+        return ShadingModelInputUi
+    raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
+
+
+@profiling.timed("save_json")
+def save_json(
+    json_data: dict,
+    name: str,
+    fdir=pathlib.Path(".").parent,
+    format="default",
+    serializer=None,
+):
     """
-    saves json file under given name
+    saves json file under given name. format is "default" (identical to
+    json.dump), "compact" or "pretty", see serializers.py
     """
     filename = str(name) + ".json"
     filepath = os.path.join(fdir, filename)
 
-    with open(filepath, "w") as outfile:
-        json.dump(json_data, outfile)
+    with profiling.stage("save_json.encode"):
+        data = serializers.dumps(json_data, format=format, serializer=serializer)
+    # written to a temporary file then renamed so a crash never leaves a partial file
+    tmp_filepath = filepath + ".tmp"
+    with profiling.stage("save_json.write"):
+        with open(tmp_filepath, "wb") as outfile:
+            outfile.write(data)
+            outfile.flush()
+            os.fsync(outfile.fileno())
+    with profiling.stage("save_json.replace"):
+        os.replace(tmp_filepath, filepath)
     return filepath
 
 
+@profiling.timed("folder_creation")
 def folder_creation(parent_fpath, fname, input_json_data):
     """
     Creates a folder structure if it doesn't exist and saves data into files
@@ -41,40 +68,387 @@ def folder_creation(parent_fpath, fname, input_json_data):
     fpath = os.path.join(parent_fpath, fname)
     inputs_fpath = os.path.join(fpath, "in")
     outputs_fpath = os.path.join(fpath, "out")
-    pathlib.Path(fpath).mkdir(parents=True, exist_ok=True)
-    pathlib.Path(inputs_fpath).mkdir(parents=True, exist_ok=True)
-    pathlib.Path(outputs_fpath).mkdir(parents=True, exist_ok=True)
+    with profiling.stage("folder_creation.mkdir"):
+        pathlib.Path(fpath).mkdir(parents=True, exist_ok=True)
+        pathlib.Path(inputs_fpath).mkdir(parents=True, exist_ok=True)
+        pathlib.Path(outputs_fpath).mkdir(parents=True, exist_ok=True)
     fp = save_json(input_json_data, fname, inputs_fpath)
     return fp
 
 
-def single_parameter_variation(parent_folder, parameter_name, start_value, end_value, step, global_params):
+def print_progress(n_written, elapsed):
+    """
+    default progress report for bulk_folder_creation
+    """
+    rate = n_written / elapsed if elapsed else 0
+    print(f"{n_written} cases written in {elapsed:.1f}s ({rate:.1f} cases/s)")
+
+
+def bulk_folder_creation(
+    parent_folder,
+    input_json_datas,
+    max_workers=8,
+    executor="thread",
+    max_in_flight=None,
+    progress=print_progress,
+    progress_every=1000,
+    names=None,
+):
+    """
+    Runs folder_creation for each parameter dict across a thread or process
+    pool, with at most max_in_flight (default 4 x max_workers) cases queued
+    at once. Yields (name, filepath) in the order the cases finish.
+    Cases are named with a uuid unless names are given.
+    progress(n_written, elapsed) is called every progress_every cases and at the end.
+    """
+    executors = {"thread": ThreadPoolExecutor, "process": ProcessPoolExecutor}
+    if executor not in executors:
+        raise ValueError(f"executor must be one of {list(executors)}")
+    if max_in_flight is None:
+        max_in_flight = 4 * max_workers
+
+    start = time.perf_counter()
+    n_written = 0
+    in_flight = {}
+    input_json_datas = iter(input_json_datas)
+    names = iter(names) if names is not None else None
+    with executors[executor](max_workers=max_workers) as pool:
+        while True:
+            for input_json_data in input_json_datas:
+                fname = next(names) if names is not None else str(uuid.uuid4())
+                future = pool.submit(
+                    folder_creation, parent_folder, fname, input_json_data
+                )
+                in_flight[future] = fname
+                if len(in_flight) >= max_in_flight:
+                    break
+            if not in_flight:
+                break
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                fname = in_flight.pop(future)
+                yield fname, future.result()
+                n_written += 1
+                if progress and n_written % progress_every == 0:
+                    progress(n_written, time.perf_counter() - start)
+    if progress and n_written % progress_every:
+        progress(n_written, time.perf_counter() - start)
+
+
+def _case_values(cases, global_params):
+    ui = ShadingModelInput(global_params)
+    for case in cases:
+        with profiling.stage("case_value"):
+            ui.value = case
+            value = ui.value
+        yield value
+
+
+def _named_case_values(numbered_cases, global_params, manifest, case_numbers):
+    """
+    yields (name, value) of each case. Cases being resumed keep their name
+    """
+    ui = ShadingModelInput(global_params)
+    for i, case in numbered_cases:
+        with profiling.stage("case_value"):
+            ui.value = case
+        fname = manifest.name(i) if manifest is not None else None
+        fname = fname or str(uuid.uuid4())
+        if case_numbers is not None:
+            case_numbers[fname] = [i]
+        yield fname, ui.value
+
+
+def _indexed_cases(named_values, parent_folder, case_index, reused, case_numbers):
+    """
+    names each case by its content hash. Cases already in case_index are put
+    in reused as (name, filepath) instead of being passed on to be written.
+    Entries from earlier runs whose input file was never written are rewritten
+    """
+    from case_cache import case_hash
+
+    run_start = time.time()
+    for fname, value in named_values:
+        case_id = case_hash(value, validate=False)
+        if case_numbers is not None:
+            case_numbers.setdefault(case_id, []).extend(case_numbers.pop(fname))
+        entry = case_index.lookup(case_id)
+        if entry is not None and (
+            entry["created"] >= run_start or os.path.exists(entry["input_filepath"])
+        ):
+            reused.append((case_id, entry["input_filepath"]))
+            continue
+        fpath = os.path.join(parent_folder, case_id)
+        input_fpath = os.path.join(fpath, "in", case_id + ".json")
+        case_index.add(case_id, fpath, input_fpath)
+        yield case_id, value
+
+
+def _planned_cases(named_values, manifest, case_numbers):
+    for fname, value in named_values:
+        manifest.record(case_numbers[fname][-1], "planned", name=fname)
+        manifest.flush()
+        yield fname, value
+
+
+def iter_parameter_variation(
+    parent_folder,
+    cases,
+    global_params={},
+    max_workers=None,
+    executor="thread",
+    case_index=None,
+    manifest=None,
+    asset_store=None,
+    progress=print_progress,
+    progress_every=1000,
+):
     """
-    Could make this into a multiple param varation thing - need to tidy this 
+    Lazily creates a case folder for each parameter dict in cases, yielding
+    (name, filepath) as each is written so nothing is collected in memory.
+    If max_workers is given the folders are written in parallel by bulk_folder_creation,
+    which calls progress(n_written, elapsed) every progress_every cases (None for no report).
+    If a case_index (case_cache.CaseIndex) is given cases are named by their
+    content hash and cases already in the index are yielded without being rewritten,
+    the size of each case written is recorded in the index.
+    If a manifest (sweep_manifest.SweepManifest) is given the status of each
+    case is recorded and cases it records as written are skipped, so an
+    interrupted sweep can be resumed by running it again with the same manifest.
+    If an asset_store (shared_assets.AssetStore) is given the context and
+    custom shade files are stored there once and the cases point at them
     """
-    ui = ShadingModelInputUi()
-    ui.value = global_params
-    param_array = np.linspace(
-        start_value, end_value, int(round((end_value - start_value) / step, 0) + 1)
-    ).round(decimals=3)
+    numbered_cases = enumerate(cases)
+    case_numbers = None
+    if manifest is not None:
+        numbered_cases = manifest.pending(numbered_cases)
+        case_numbers = {}
+    named_values = _named_case_values(
+        numbered_cases, global_params, manifest, case_numbers
+    )
+    if asset_store is not None:
+        named_values = (
+            (fname, asset_store.rewrite(value)) for fname, value in named_values
+        )
+    reused = collections.deque()
+    if case_index is not None:
+        named_values = _indexed_cases(
+            named_values, parent_folder, case_index, reused, case_numbers
+        )
+    if manifest is not None:
+        named_values = _planned_cases(named_values, manifest, case_numbers)
+    if max_workers:
+        names, values = itertools.tee(named_values)
+        written = bulk_folder_creation(
+            parent_folder,
+            (value for _, value in values),
+            max_workers=max_workers,
+            executor=executor,
+            progress=progress,
+            progress_every=progress_every,
+            names=(name for name, _ in names),
+        )
+    else:
+        written = (
+            (fname, folder_creation(parent_folder, fname, value))
+            for fname, value in named_values
+        )
+
+    def done(fname, fp):
+        profiling.count("cases_written")
+        if manifest is not None:
+            numbers = case_numbers[fname]
+            manifest.record(numbers.pop(0), "written", name=fname, filepath=fp)
+            if not numbers:
+                del case_numbers[fname]
+        return fname, fp
+
+    for fname, fp in written:
+        if case_index is not None:
+            case_index.set_size(fname, os.path.getsize(fp))
+        yield done(fname, fp)
+        while reused:
+            yield done(*reused.popleft())
+    while reused:
+        yield done(*reused.popleft())
+    if case_index is not None:
+        case_index.flush()
+    if manifest is not None:
+        manifest.flush()
+
+
+def _feasible_cases(cases, global_params):
+    from bulk_validation import valid_cases
+    from geometry_check import feasible_cases
+
+    return feasible_cases(valid_cases(cases, global_params), global_params)
+
+
+def multi_parameter_variation(
+    parent_folder,
+    axes,
+    global_params={},
+    method="grid",
+    n_samples=None,
+    seed=None,
+    max_workers=None,
+    executor="thread",
+    case_index=None,
+    drop_invalid=False,
+    manifest=None,
+    asset_store=None,
+    progress=print_progress,
+    progress_every=1000,
+):
+    """
+    Varies any number of parameters together, see sweep.py for the axes format.
+    method is "grid" (cartesian product), "latin_hypercube" or "sobol".
+    With drop_invalid, cases that fail bulk_validation or geometry_check are
+    skipped rather than raising part way through the sweep or failing to simulate.
+    Returns a generator of (name, filepath), files are written as it is consumed
+    """
+    from sweep import sweep_cases
+
+    if manifest is not None:
+        if method != "grid" and seed is None:
+            seed = manifest.definition["seed"] if manifest.definition else None
+            if seed is None:
+                import numpy as np
+
+                seed = int(np.random.SeedSequence().entropy)
+        manifest.open_sweep(
+            dict(
+                axes=axes,
+                global_params=global_params,
+                method=method,
+                n_samples=n_samples,
+                seed=seed,
+                drop_invalid=drop_invalid,
+            )
+        )
+    cases = sweep_cases(axes, method=method, n_samples=n_samples, seed=seed)
+    if drop_invalid:
+        cases = _feasible_cases(cases, global_params)
+    return iter_parameter_variation(
+        parent_folder,
+        cases,
+        global_params,
+        max_workers=max_workers,
+        executor=executor,
+        case_index=case_index,
+        manifest=manifest,
+        asset_store=asset_store,
+        progress=progress,
+        progress_every=progress_every,
+    )
+
+
+def adaptive_parameter_variation(
+    parent_folder,
+    axes,
+    metric,
+    tolerance,
+    max_cases=None,
+    global_params={},
+    initial=3,
+    known=(),
+    max_workers=None,
+    executor="thread",
+    case_index=None,
+    asset_store=None,
+    progress=print_progress,
+    progress_every=1000,
+):
+    """
+    Varies parameters adaptively, see adaptive_sweep.py. The axes are
+    refined with the metric (e.g. adaptive_sweep.screen_metric) before any
+    folders are written, so only the chosen cases are created. The known
+    cases (already simulated) are not written again, only the new ones.
+    Returns a generator of (name, filepath), files are written as it is consumed
+    """
+    from adaptive_sweep import adaptive_cases
+
+    cases = adaptive_cases(
+        axes, metric, tolerance, max_cases=max_cases, initial=initial, known=known
+    )
+    return iter_parameter_variation(
+        parent_folder,
+        cases,
+        global_params,
+        max_workers=max_workers,
+        executor=executor,
+        case_index=case_index,
+        asset_store=asset_store,
+        progress=progress,
+        progress_every=progress_every,
+    )
+
+
+def table_parameter_variation(
+    table_filepath,
+    axes,
+    global_params={},
+    method="grid",
+    n_samples=None,
+    seed=None,
+    drop_invalid=False,
+):
+    """
+    As multi_parameter_variation but writes every case as a row of one
+    parquet/arrow table (see case_table.py). Returns the number of cases
+    """
+    from case_table import write_case_table
+    from sweep import sweep_cases
+
+    cases = sweep_cases(axes, method=method, n_samples=n_samples, seed=seed)
+    if drop_invalid:
+        cases = _feasible_cases(cases, global_params)
+    return write_case_table(table_filepath, _case_values(cases, global_params))
+
+
+def single_parameter_variation(parent_folder, parameter_name, start_value, end_value, step, global_params, manifest=None):
+    """
+    Varies a single parameter, use multi_parameter_variation for large sweeps.
+    With a manifest only the cases not already written are created, but the
+    names and filepaths of every case written so far are returned
+    """
+    if manifest is not None:
+        manifest.open_sweep(
+            dict(
+                parameter_name=parameter_name,
+                start_value=start_value,
+                end_value=end_value,
+                step=step,
+                global_params=global_params,
+            )
+        )
+    from sweep import linspace_values
+
+    param_array = linspace_values(start_value, end_value, step)
+    cases = ({parameter_name: param_val} for param_val in param_array)
     names_list = []
-    filename_list = []
     filepath_list = []
-    for i, param_val in enumerate(param_array):
-        fname = str(uuid.uuid4())
-        ui.value = {parameter_name: param_val}
-        fp = folder_creation(parent_folder, fname, ui.value)
+    for fname, fp in iter_parameter_variation(
+        parent_folder, cases, global_params, manifest=manifest
+    ):
         names_list.append(fname)
         filepath_list.append(fp)
+    if manifest is not None:
+        written = manifest.written()
+        names_list = [fname for fname, _ in written]
+        filepath_list = [fp for _, fp in written]
     return names_list, filepath_list
 
-def read_json(path, filename=""):
+def read_json(path, filename="", serializer=None):
+    """
+    reads a json file with the fast reader (see serializers.py), objects
+    come back as dicts in file order
+    """
     if filename:
         filepath = os.path.join(path, filename)
     else:
         filepath = os.path.join(path)
-    f = open(filepath, "r")
-    return json.load(f, object_pairs_hook=OrderedDict)
+    with open(filepath, "rb") as f:
+        return serializers.loads(f.read(), serializer=serializer)
 
 if __name__ == "__main__":
     APERTURES_ARRAY = [
@@ -99,7 +473,7 @@ if __name__ == "__main__":
             "extra_reveal_depth":0.0,
         },
     ]
-    ui = ShadingModelInputUi()
+    ui = ShadingModelInput()
     fname = str(uuid.uuid4())
     ui.value = {"apertures":APERTURES_ARRAY}
     fpath = folder_creation("test_results", fname, ui.value)
@@ -0,0 +1,270 @@
+import itertools
+import numpy as np
+import pandas as pd
+
+from shading_models import ApertureParameters, ShadingModelInput
+
+"""
+Fast geometric feasibility checks for whole batches of cases, before any
+files are written or simulations run. Cases are turned into arrays, with the
+apertures padded to (n_cases, max apertures per case), and every check runs
+over the whole batch at once.
+
+Geometry conventions (all in m, on the plane of the wall the aperture is in):
+    - faces 0 and 2 run along the room depth, faces 1 and 3 along the width
+    - horizontal positions are measured from the centre of the wall, the
+      aperture centre is at aperture_offset
+    - heights are measured from the floor, the wall runs 0 to room_height
+    - overhangs, louvre/fin arrays and vertical fins are created for every
+      aperture and are centred on it (plus their own offsets)
+    - louvres are stacked vertically, fins (toggle_fins_or_louvres) are spaced
+      horizontally, the array spans (number_of_shades - 1) * distance_between_shades
+"""
+
+TOLERANCE = 1e-9
+
+CASE_FIELDS = [
+    "room_width",
+    "room_depth",
+    "room_height",
+    "toggle_overhang",
+    "overhang_width",
+    "overhang_depth",
+    "overhang_height_above_window",
+    "overhang_offset",
+    "overhang_angle",
+    "toggle_louvre_creation",
+    "toggle_fins_or_louvres",
+    "blade_depth",
+    "number_of_shades",
+    "distance_between_shades",
+    "louvre_offset_distance",
+    "extra_blade_width",
+    "toggle_external_vertical_fin",
+    "vertical_fin_height",
+    "vertical_fin_depth",
+    "reverse_fin_side",
+    "fin_window_offset",
+    "fin_vertical_offset",
+]
+APERTURE_FIELDS = [
+    "room_face",
+    "aperture_offset",
+    "aperture_width",
+    "sill_height",
+    "aperture_height",
+]
+
+
+def _defaults(case_fields=CASE_FIELDS):
+    value = ShadingModelInput().value
+    return {k: value[k] for k in case_fields} | {"apertures": value["apertures"]}
+
+
+def case_arrays(
+    cases: list[dict], case_fields=CASE_FIELDS, aperture_fields=APERTURE_FIELDS
+) -> dict:
+    """
+    case level fields as (n_cases,) arrays and aperture fields as
+    (n_cases, max apertures) arrays, padded with nan. "has_aperture" marks
+    the real apertures. Missing fields (of the cases and of each aperture)
+    take their defaults
+    """
+    defaults = _defaults(case_fields)
+    aperture_defaults = ApertureParameters().model_dump()
+    df = pd.DataFrame([defaults | case for case in cases])
+    arrays = {k: df[k].to_numpy(dtype=float) for k in case_fields}
+    apertures = df["apertures"].tolist()
+    n_max = max((len(a) for a in apertures), default=0)
+    for k in aperture_fields:
+        arrays[k] = np.full((len(df), n_max), np.nan)
+    arrays["has_aperture"] = np.zeros((len(df), n_max), dtype=bool)
+    names = np.full((len(df), n_max), "", dtype=object)
+    for i, case_apertures in enumerate(apertures):
+        for j, aperture in enumerate(case_apertures):
+            aperture = aperture_defaults | aperture
+            for k in aperture_fields:
+                arrays[k][i, j] = aperture[k]
+            names[i, j] = aperture["aperture_name"]
+            arrays["has_aperture"][i, j] = True
+    arrays["aperture_name"] = names
+    return arrays
+
+
+def _within(low, high, wall_low, wall_high):
+    return (low >= wall_low - TOLERANCE) & (high <= wall_high + TOLERANCE)
+
+
+def _overlap(low_a, high_a, low_b, high_b):
+    return (low_a < high_b - TOLERANCE) & (low_b < high_a - TOLERANCE)
+
+
+def device_extents(a: dict) -> dict:
+    """
+    the (low, high) horizontal x, vertical z and depth y (out from the glazing)
+    extents of the aperture and each shading device, as (n_cases, max apertures) arrays
+    """
+    c = {k: a[k][:, None] for k in CASE_FIELDS}
+    x_centre = a["aperture_offset"]
+    z_centre = a["sill_height"] + a["aperture_height"] / 2
+    half_width = a["aperture_width"] / 2
+    half_height = a["aperture_height"] / 2
+    zeros = np.zeros_like(x_centre)
+    e = {}
+    e["aperture_x"] = (x_centre - half_width, x_centre + half_width)
+    e["aperture_z"] = (a["sill_height"], a["sill_height"] + a["aperture_height"])
+
+    overhang_z = e["aperture_z"][1] + c["overhang_height_above_window"]
+    angle = np.radians(c["overhang_angle"])
+    drop = c["overhang_depth"] * np.sin(angle)
+    overhang_x = x_centre + c["overhang_offset"]
+    e["overhang_x"] = (
+        overhang_x - c["overhang_width"] / 2,
+        overhang_x + c["overhang_width"] / 2,
+    )
+    e["overhang_z"] = (
+        np.minimum(overhang_z, overhang_z - drop),
+        np.maximum(overhang_z, overhang_z - drop),
+    )
+    e["overhang_y"] = (zeros, zeros + np.abs(c["overhang_depth"] * np.cos(angle)))
+
+    span = (c["number_of_shades"] - 1).clip(min=0) * c["distance_between_shades"] / 2
+    fins = c["toggle_fins_or_louvres"].astype(bool)
+    array_half_x = np.where(fins, span, half_width + c["extra_blade_width"])
+    array_half_z = np.where(fins, half_height + c["extra_blade_width"], span)
+    e["louvre_x"] = (x_centre - array_half_x, x_centre + array_half_x)
+    e["louvre_z"] = (z_centre - array_half_z, z_centre + array_half_z)
+    e["louvre_y"] = (
+        zeros + c["louvre_offset_distance"],
+        zeros + c["louvre_offset_distance"] + c["blade_depth"],
+    )
+
+    side = np.where(c["reverse_fin_side"].astype(bool), -1, 1)
+    fin_x = x_centre + side * (half_width + c["fin_window_offset"])
+    fin_z = z_centre + c["fin_vertical_offset"]
+    e["fin_x"] = (fin_x, fin_x)
+    e["fin_z"] = (
+        fin_z - c["vertical_fin_height"] / 2,
+        fin_z + c["vertical_fin_height"] / 2,
+    )
+    e["fin_y"] = (zeros, zeros + c["vertical_fin_depth"])
+    return e
+
+
+def _clash(e, device_a, device_b):
+    """
+    devices clash if their extents overlap in all three directions. A vertical
+    fin has no width so clashes if it is strictly within the other device
+    """
+    return (
+        _overlap(*e[f"{device_a}_x"], *e[f"{device_b}_x"])
+        & _overlap(*e[f"{device_a}_y"], *e[f"{device_b}_y"])
+        & _overlap(*e[f"{device_a}_z"], *e[f"{device_b}_z"])
+    )
+
+
+def geometry_checks(a: dict) -> list:
+    """
+    returns [(reason, invalid)] where invalid is a (n_cases, max apertures) bool
+    array of the apertures that fail the check
+    """
+    e = device_extents(a)
+    c = {k: a[k][:, None] for k in CASE_FIELDS}
+    wall_length = np.where(
+        np.isin(a["room_face"], [0, 2]), c["room_depth"], c["room_width"]
+    )
+    wall_half = wall_length / 2
+    wall_x = (-wall_half, wall_half)
+    wall_z = (0, c["room_height"])
+    overhang = c["toggle_overhang"].astype(bool)
+    louvre = c["toggle_louvre_creation"].astype(bool)
+    fin = c["toggle_external_vertical_fin"].astype(bool)
+
+    def outside(device):
+        return ~_within(*e[f"{device}_x"], *wall_x), ~_within(*e[f"{device}_z"], *wall_z)
+
+    aperture_x, aperture_z = outside("aperture")
+    overhang_x, overhang_z = outside("overhang")
+    louvre_x, louvre_z = outside("louvre")
+    fin_x, fin_z = outside("fin")
+    checks = [
+        ("aperture is wider than its wall", aperture_x),
+        ("aperture is taller than the room", aperture_z),
+        ("overhang is wider than the wall", overhang & overhang_x),
+        ("overhang is above the room", overhang & overhang_z),
+        ("louvre/fin array is wider than the wall", louvre & louvre_x),
+        ("louvre/fin array is taller than the room", louvre & louvre_z),
+        ("vertical fin is outside the wall", fin & fin_x),
+        ("vertical fin is taller than the room", fin & fin_z),
+        (
+            "overhang clashes with louvre/fin array",
+            overhang & louvre & _clash(e, "overhang", "louvre"),
+        ),
+        (
+            "vertical fin clashes with overhang",
+            fin & overhang & _clash(e, "fin", "overhang"),
+        ),
+        (
+            "vertical fin clashes with louvre/fin array",
+            fin & louvre & _clash(e, "fin", "louvre"),
+        ),
+    ]
+
+    # apertures on the same face of the same case overlapping each other
+    same_face = (a["room_face"][:, :, None] == a["room_face"][:, None, :]) & (
+        a["has_aperture"][:, :, None] & a["has_aperture"][:, None, :]
+    )
+    n_max = a["room_face"].shape[1]
+    same_face &= ~np.eye(n_max, dtype=bool)
+    x_low, x_high = e["aperture_x"]
+    z_low, z_high = e["aperture_z"]
+    overlaps = (
+        same_face
+        & _overlap(x_low[:, :, None], x_high[:, :, None], x_low[:, None], x_high[:, None])
+        & _overlap(z_low[:, :, None], z_high[:, :, None], z_low[:, None], z_high[:, None])
+    )
+    checks.append(("aperture overlaps another on the same face", overlaps.any(axis=2)))
+    return [(reason, invalid & a["has_aperture"]) for reason, invalid in checks]
+
+
+def check_geometry(cases: list[dict]) -> tuple[np.ndarray, pd.Series]:
+    """
+    checks the geometry of every case in one pass. Returns a bool mask of the
+    feasible cases and a Series (invalid cases only) of the list of reasons
+    each failed, as bulk_validation.validate_frame
+    """
+    a = case_arrays(cases)
+    checks = geometry_checks(a)
+    if not checks or a["room_face"].shape[1] == 0:
+        return np.ones(len(cases), dtype=bool), pd.Series([], dtype=object)
+    invalid = np.stack([i for _, i in checks], axis=2)  # case, aperture, check
+    mask = ~invalid.any(axis=(1, 2))
+    invalid_rows = np.flatnonzero(~mask)
+    errors = pd.Series(
+        [
+            [
+                f"{a['aperture_name'][row, ap]}: {checks[check][0]}"
+                for ap, check in zip(*np.nonzero(invalid[row]))
+            ]
+            for row in invalid_rows
+        ],
+        index=invalid_rows,
+        dtype=object,
+    )
+    return mask, errors
+
+
+def feasible_cases(cases, global_params={}, chunk_size=10000, on_invalid=None):
+    """
+    filters an iterable of case dicts, checking chunk_size cases at a time
+    merged over global_params. on_invalid(case, reasons) is called for each
+    case that is dropped
+    """
+    cases = iter(cases)
+    while chunk := list(itertools.islice(cases, chunk_size)):
+        mask, errors = check_geometry([global_params | case for case in chunk])
+        for i, (case, is_feasible) in enumerate(zip(chunk, mask)):
+            if is_feasible:
+                yield case
+            elif on_invalid is not None:
+                on_invalid(case, errors[i])
@@ -0,0 +1,62 @@
+import json
+import os
+
+"""
+Append-only log of json objects, one per line, that is replayed when it is
+reopened. The base of sweep_manifest.SweepManifest and scheduler.JobQueue.
+Records are flushed and fsync'd every fsync_every records. A last line
+without a newline was cut short by a crash and is cut off when the log is
+reopened, so the next record starts on a line of its own.
+"""
+
+
+class JsonLinesLog:
+    def __init__(self, filepath, fsync_every=1):
+        self.filepath = filepath
+        self.fsync_every = fsync_every
+        if os.path.exists(filepath):
+            self._replay()
+        self._file = open(filepath, "a")
+        self._n_pending = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _replay(self):
+        with open(self.filepath, "rb") as f:
+            lines = f.readlines()
+        offset = 0
+        for line in lines:
+            if not line.endswith(b"\n"):
+                # partly written last line from a crash (even if it parses,
+                # the next record would be appended to it), cut it off
+                with open(self.filepath, "r+b") as f:
+                    f.truncate(offset)
+                break
+            self._replay_entry(json.loads(line))
+            offset += len(line)
+
+    def _replay_entry(self, entry):
+        """
+        applies an entry read back from the file, implemented by subclasses
+        """
+        raise NotImplementedError
+
+    def _write(self, entry):
+        self._file.write(json.dumps(entry) + "\n")
+        self._n_pending += 1
+        if self._n_pending >= self.fsync_every:
+            self.flush()
+
+    def flush(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._n_pending = 0
+
+    def close(self):
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
@@ -0,0 +1,196 @@
+import contextlib
+import functools
+import json
+import os
+import threading
+import time
+
+"""
+Opt-in timers and counters for finding where a sweep spends its time
+(validation, widget traitlets, json encoding, mkdir...). The pipeline is
+instrumented with stage() blocks, @timed functions and count() calls which
+do nothing but check a flag until profiling is enabled:
+
+    import profiling
+    with profiling.profile():
+        list(multi_parameter_variation(...))
+    profiling.print_summary()
+    profiling.export_chrome_trace("sweep_trace.json")
+
+The trace is in the Chrome trace event format, which chrome://tracing,
+Perfetto and speedscope open. Stage times are inclusive of nested stages.
+Only the std library is imported so it is safe to use from any module.
+"""
+
+MAX_EVENTS = 1_000_000
+
+_enabled = False
+_lock = threading.Lock()
+_stages = {}  # name -> [calls, total, min, max] (seconds)
+_counters = {}  # name -> count
+_events = []  # (name, start, duration, thread id) (seconds)
+_origin = time.perf_counter()
+_null = contextlib.nullcontext()
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def enable(reset_records=True):
+    global _enabled
+    if reset_records:
+        reset()
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def reset():
+    global _origin
+    with _lock:
+        _stages.clear()
+        _counters.clear()
+        _events.clear()
+        _origin = time.perf_counter()
+
+
+@contextlib.contextmanager
+def profile(reset_records=True):
+    """
+    enables profiling for the duration of the block
+    """
+    enable(reset_records)
+    try:
+        yield
+    finally:
+        disable()
+
+
+def _record(name, start, duration):
+    with _lock:
+        stage = _stages.get(name)
+        if stage is None:
+            _stages[name] = [1, duration, duration, duration]
+        else:
+            stage[0] += 1
+            stage[1] += duration
+            stage[2] = min(stage[2], duration)
+            stage[3] = max(stage[3], duration)
+        if len(_events) < MAX_EVENTS:
+            _events.append((name, start - _origin, duration, threading.get_ident()))
+
+
+@contextlib.contextmanager
+def _timed_stage(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _record(name, start, time.perf_counter() - start)
+
+
+def stage(name):
+    """
+    context manager timing the block as the stage name
+    """
+    if not _enabled:
+        return _null
+    return _timed_stage(name)
+
+
+def timed(name):
+    """
+    decorator timing each call of the function as the stage name
+    """
+
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return function(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                _record(name, start, time.perf_counter() - start)
+
+        return wrapper
+
+    return decorator
+
+
+def count(name, n=1):
+    if _enabled:
+        with _lock:
+            _counters[name] = _counters.get(name, 0) + n
+
+
+def summary() -> list[dict]:
+    """
+    one row per stage (most total time first) then one per counter
+    """
+    with _lock:
+        rows = [
+            dict(
+                stage=name,
+                calls=calls,
+                total_s=total,
+                mean_ms=total / calls * 1e3,
+                min_ms=low * 1e3,
+                max_ms=high * 1e3,
+            )
+            for name, (calls, total, low, high) in _stages.items()
+        ]
+        rows.sort(key=lambda row: row["total_s"], reverse=True)
+        rows += [dict(stage=name, calls=n) for name, n in _counters.items()]
+    return rows
+
+
+def format_summary() -> str:
+    columns = ["calls", "total s", "mean ms", "min ms", "max ms"]
+    lines = [f"{'stage':<40}" + "".join(f"{c:>10}" for c in columns)]
+    for row in summary():
+        if "total_s" in row:
+            lines.append(
+                f"{row['stage']:<40}{row['calls']:>10}{row['total_s']:>10.3f}"
+                f"{row['mean_ms']:>10.3f}{row['min_ms']:>10.3f}{row['max_ms']:>10.3f}"
+            )
+        else:
+            lines.append(f"{row['stage']:<40}{row['calls']:>10}")
+    return "\n".join(lines)
+
+
+def print_summary():
+    print(format_summary())
+
+
+def export_chrome_trace(filepath) -> str:
+    """
+    writes the recorded stages as complete ("X") events and the counters as
+    metadata, in the Chrome trace event format
+    """
+    pid = os.getpid()
+    with _lock:
+        events = [
+            dict(
+                name=name,
+                cat="sweep",
+                ph="X",
+                ts=start * 1e6,
+                dur=duration * 1e6,
+                pid=pid,
+                tid=tid,
+            )
+            for name, start, duration, tid in _events
+        ]
+        counters = dict(_counters)
+    with open(filepath, "w") as f:
+        json.dump(
+            dict(traceEvents=events, displayTimeUnit="ms", otherData=dict(counters=counters)),
+            f,
+        )
+    return filepath
@@ -0,0 +1,168 @@
+import fnmatch
+import glob
+import itertools
+import json
+import os
+import pathlib
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+
+from file_creation import read_json, save_json
+
+"""
+Aggregates the results of a sweep into one table. The case tree made by
+folder_creation (<name>/in/<name>.json, results in <name>/out) or by
+parameter_variation (<name>/<name>.json, results below <name>) is walked
+lazily, result files are parsed in parallel a chunk at a time, joined to the
+case inputs and each chunk is written as its own parquet file so memory
+stays bounded. A state file records which result files have been read so
+a refresh only reads new or changed ones.
+"""
+
+STATE_NAME = "_state"
+
+
+def read_results(path, filename=""):
+    """
+    reads a results file as a string
+    """
+    filepath = os.path.join(path, filename) if filename else path
+    with open(filepath, "r") as f:
+        return f.read()
+
+
+def read_json_results(filepath) -> dict:
+    """
+    the scalar values of a json results file
+    """
+    data = read_json(filepath)
+    return {k: v for k, v in data.items() if not isinstance(v, (dict, list))}
+
+
+def read_ill_results(filepath) -> dict:
+    """
+    summary of a Radiance .ill file (grid points x sun up hours, tab separated)
+    """
+    values = pd.read_csv(filepath, sep="\t", header=None).to_numpy(dtype=float)
+    stem = pathlib.Path(filepath).stem
+    return {f"{stem}_mean": values.mean(), f"{stem}_max": values.max()}
+
+
+DEFAULT_PARSERS = {
+    "*_results.json": read_json_results,
+    "*.ill": read_ill_results,
+}
+
+
+def iter_cases(parent_folder):
+    """
+    walks the case tree, yielding (name, input_filepath, results_folder) for each case
+    """
+    for root, dirs, files in os.walk(parent_folder):
+        name = os.path.basename(root)
+        input_fpath = os.path.join(root, "in", name + ".json")
+        if "in" in dirs and os.path.isfile(input_fpath):
+            dirs.clear()
+            yield name, input_fpath, os.path.join(root, "out")
+        elif name + ".json" in files:
+            dirs.clear()
+            yield name, os.path.join(root, name + ".json"), root
+
+
+def result_files(results_folder, parsers=DEFAULT_PARSERS) -> list:
+    """
+    the result files of a case that have a parser, sorted
+    """
+    fpaths = []
+    for root, _, files in os.walk(results_folder):
+        for f in files:
+            if any(fnmatch.fnmatch(f, pattern) for pattern in parsers):
+                fpaths.append(os.path.join(root, f))
+    return sorted(fpaths)
+
+
+def _signature(fpaths) -> list:
+    signature = []
+    for fpath in fpaths:
+        stat = os.stat(fpath)
+        signature.append([fpath, stat.st_mtime_ns, stat.st_size])
+    return signature
+
+
+def _flatten_inputs(inputs: dict) -> dict:
+    return {
+        k: json.dumps(v) if isinstance(v, (dict, list)) else v for k, v in inputs.items()
+    }
+
+
+def _read_case(name, input_fpath, fpaths, parsers) -> dict:
+    row = {"case_name": name} | _flatten_inputs(read_json(input_fpath))
+    for fpath in fpaths:
+        for pattern, parser in parsers.items():
+            if fnmatch.fnmatch(os.path.basename(fpath), pattern):
+                row |= parser(fpath)
+                break
+    return row
+
+
+def _changed_cases(parent_folder, parsers, state):
+    for name, input_fpath, results_folder in iter_cases(parent_folder):
+        fpaths = result_files(results_folder, parsers)
+        if not fpaths:
+            continue  # not simulated yet
+        signature = _signature(fpaths)
+        if state.get(name) != signature:
+            yield name, input_fpath, fpaths, signature
+
+
+def _part_fpaths(output_folder):
+    return sorted(glob.glob(os.path.join(output_folder, "part-*.parquet")))
+
+
+def aggregate_results(
+    parent_folder,
+    output_folder,
+    parsers=DEFAULT_PARSERS,
+    max_workers=8,
+    chunk_size=1000,
+):
+    """
+    reads the results of every case that is new or has changed since the
+    last run and appends them, joined to the case inputs, to the parquet
+    parts in output_folder. Returns the number of cases read
+    """
+    pathlib.Path(output_folder).mkdir(parents=True, exist_ok=True)
+    state_fpath = os.path.join(output_folder, STATE_NAME + ".json")
+    state = read_json(state_fpath) if os.path.exists(state_fpath) else {}
+    n_parts = len(_part_fpaths(output_folder))
+    n_read = 0
+    cases = _changed_cases(parent_folder, parsers, state)
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        while chunk := list(itertools.islice(cases, chunk_size)):
+            rows = list(
+                pool.map(
+                    lambda case: _read_case(case[0], case[1], case[2], parsers), chunk
+                )
+            )
+            part_fpath = os.path.join(output_folder, f"part-{n_parts:05d}.parquet")
+            pd.DataFrame(rows).to_parquet(part_fpath, index=False)
+            n_parts += 1
+            n_read += len(rows)
+            for name, _, _, signature in chunk:
+                state[name] = signature
+            save_json(state, STATE_NAME, output_folder)
+    return n_read
+
+
+def read_results_table(output_folder, columns=None) -> pd.DataFrame:
+    """
+    the aggregated results, with only the latest row of each case
+    """
+    parts = [
+        pd.read_parquet(fpath, columns=columns)
+        for fpath in _part_fpaths(output_folder)
+    ]
+    if not parts:
+        return pd.DataFrame()
+    df = pd.concat(parts, ignore_index=True)
+    return df.drop_duplicates("case_name", keep="last").reset_index(drop=True)
@@ -0,0 +1,220 @@
+import hashlib
+import os
+import subprocess
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+from file_creation import read_json
+from jsonl_log import JsonLinesLog
+from results import iter_cases, result_files
+
+"""
+Local scheduler for simulating the case folders written by file_creation.
+Pending cases are found by walking the case tree and run across a pool of
+workers, each case as a subprocess of the pluggable simulation command with
+a timeout, its stdout and stderr captured to out/stdout.log and
+out/stderr.log. Failed cases are retried. The status of every case is kept
+in an append-only queue file (one json object per line, see
+jsonl_log.py) so an interrupted run picks up where it stopped. It is
+fsync'd after every record so it is kept on local disk, by default one file
+per parent folder under the temp directory (see default_queue_filepath).
+
+The command is a list of arguments formatted with the case's {name},
+{input_filepath}, {case_folder} and {results_folder}, e.g.
+    ["python", "simulate.py", "{input_filepath}", "{results_folder}"]
+or a callable(name, input_filepath, results_folder) returning the arguments.
+"""
+
+QUEUE_STATUSES = ["queued", "running", "done", "failed"]
+
+
+def default_queue_filepath(parent_folder) -> str:
+    """
+    a queue file on local disk for parent_folder, which may be on a share
+    """
+    key = hashlib.sha256(os.path.abspath(parent_folder).encode("utf-8")).hexdigest()[:16]
+    folder = os.path.join(tempfile.gettempdir(), "shading_queues")
+    os.makedirs(folder, exist_ok=True)
+    return os.path.join(folder, f"{os.path.basename(os.path.abspath(parent_folder))}_{key}.jsonl")
+
+
+class JobQueue(JsonLinesLog):
+    def __init__(self, filepath, fsync_every=1):
+        self._cases = {}  # case name -> latest record
+        super().__init__(filepath, fsync_every=fsync_every)
+
+    def _replay_entry(self, entry):
+        self._apply(entry)
+
+    def _apply(self, entry):
+        record = self._cases.setdefault(entry["case"], {"attempts": 0})
+        record |= entry
+
+    def record(self, name, status, **info):
+        if status not in QUEUE_STATUSES:
+            raise ValueError(f"status must be one of {QUEUE_STATUSES}")
+        entry = {"case": name, "status": status, "time": time.time()} | info
+        self._apply(entry)
+        self._write(entry)
+
+    def status(self, name) -> str | None:
+        return self._cases.get(name, {}).get("status")
+
+    def attempts(self, name) -> int:
+        return self._cases.get(name, {}).get("attempts", 0)
+
+    def names(self, status) -> list[str]:
+        return [name for name, record in self._cases.items() if record["status"] == status]
+
+    def records(self, status) -> list[dict]:
+        return [record for record in self._cases.values() if record["status"] == status]
+
+
+def format_command(command, name, input_filepath, results_folder) -> list[str]:
+    if callable(command):
+        return [str(arg) for arg in command(name, input_filepath, results_folder)]
+    fields = dict(
+        name=name,
+        input_filepath=input_filepath,
+        case_folder=os.path.dirname(results_folder),
+        results_folder=results_folder,
+    )
+    # only the placeholders are replaced, other braces are left as they are
+    args = []
+    for arg in command:
+        for key, value in fields.items():
+            arg = arg.replace("{" + key + "}", str(value))
+        args.append(arg)
+    return args
+
+
+def run_case(args, results_folder, timeout=None) -> dict:
+    """
+    runs one case, returning its returncode (None if it timed out), the
+    elapsed seconds and any error
+    """
+    os.makedirs(results_folder, exist_ok=True)
+    start = time.perf_counter()
+    returncode, error = None, None
+    with open(os.path.join(results_folder, "stdout.log"), "wb") as stdout, open(
+        os.path.join(results_folder, "stderr.log"), "wb"
+    ) as stderr:
+        try:
+            returncode = subprocess.run(
+                args, stdout=stdout, stderr=stderr, timeout=timeout
+            ).returncode
+            if returncode:
+                error = f"exited with {returncode}"
+        except subprocess.TimeoutExpired:
+            error = f"timed out after {timeout}s"
+        except OSError as e:
+            error = str(e)
+    return dict(returncode=returncode, elapsed=time.perf_counter() - start, error=error)
+
+
+def pending_cases(parent_folder, queue, retries=2, skip_with_results=False):
+    """
+    yields (name, input_filepath, results_folder) of the cases not yet done
+    and not failed more than retries times. With skip_with_results, cases
+    whose out folder already has results (see results.py) are also skipped
+    """
+    for name, input_filepath, results_folder in iter_cases(parent_folder):
+        status = queue.status(name)
+        if status == "done":
+            continue
+        if status == "failed" and queue.attempts(name) > retries:
+            continue
+        if skip_with_results and result_files(results_folder):
+            continue
+        yield name, input_filepath, results_folder
+
+
+def print_progress(n_done, n_failed, elapsed):
+    """
+    default progress report for run_cases
+    """
+    print(f"{n_done} cases simulated, {n_failed} failed in {elapsed:.1f}s")
+
+
+def run_cases(
+    parent_folder,
+    command,
+    queue_filepath=None,
+    max_workers=None,
+    executor="thread",
+    timeout=None,
+    retries=2,
+    skip_with_results=False,
+    cost_model=None,
+    order="longest_first",
+    progress=print_progress,
+    progress_every=100,
+    case_index=None,
+):
+    """
+    Simulates the pending cases of parent_folder with command, at most
+    max_workers (default the number of cpus) at once, each killed after
+    timeout seconds. A failed case is retried up to retries times. The queue
+    file should be on local disk, by default default_queue_filepath(parent_folder).
+    With a cost_model (cost_model.CostModel) the pending cases are run in
+    order of their estimated cost, see cost_model.order_cases.
+    With a case_index (case_cache.CaseIndex) the results file and size of each
+    indexed case are recorded in it when the case is done.
+    Yields (name, status, info) as each case finishes for the last time.
+    progress(n_done, n_failed, elapsed) is called every progress_every cases and at the end.
+    """
+    executors = {"thread": ThreadPoolExecutor, "process": ProcessPoolExecutor}
+    if executor not in executors:
+        raise ValueError(f"executor must be one of {list(executors)}")
+    max_workers = max_workers or os.cpu_count()
+    if queue_filepath is None:
+        queue_filepath = default_queue_filepath(parent_folder)
+
+    start = time.perf_counter()
+    counts = {"done": 0, "failed": 0}
+    in_flight = {}
+    with JobQueue(queue_filepath) as queue, executors[executor](max_workers=max_workers) as pool:
+        cases = pending_cases(parent_folder, queue, retries, skip_with_results)
+        if cost_model is not None:
+            from cost_model import order_cases
+
+            cases = list(cases)
+            costs = cost_model.estimate(read_json(case[1]) for case in cases)
+            cases = iter(order_cases(cases, costs, order))
+
+        def submit(name, input_filepath, results_folder):
+            attempts = queue.attempts(name) + 1
+            queue.record(name, "running", attempts=attempts, input_filepath=input_filepath)
+            args = format_command(command, name, input_filepath, results_folder)
+            future = pool.submit(run_case, args, results_folder, timeout)
+            in_flight[future] = (name, input_filepath, results_folder)
+
+        while True:
+            for case in cases:
+                submit(*case)
+                if len(in_flight) >= max_workers:
+                    break
+            if not in_flight:
+                break
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                case = in_flight.pop(future)
+                info = future.result()
+                status = "done" if info["returncode"] == 0 else "failed"
+                queue.record(case[0], status, **info)
+                if status == "done" and case_index is not None and case[0] in case_index:
+                    files = result_files(case[2])
+                    case_index.set_results(case[0], files[0] if files else case[2])
+                if status == "failed" and queue.attempts(case[0]) <= retries:
+                    submit(*case)
+                    continue
+                yield case[0], status, info
+                counts[status] += 1
+                n_finished = counts["done"] + counts["failed"]
+                if progress and n_finished % progress_every == 0:
+                    progress(counts["done"], counts["failed"], time.perf_counter() - start)
+    if case_index is not None:
+        case_index.flush()
+    if progress and (counts["done"] + counts["failed"]) % progress_every:
+        progress(counts["done"], counts["failed"], time.perf_counter() - start)
@@ -0,0 +1,100 @@
+import functools
+import importlib.util
+import json
+
+"""
+Pluggable json serializers for the case files. A serializer is a pair of
+dumps(data, format) -> bytes and loads(bytes or str) functions, registered
+by name. orjson is used when it is installed, otherwise the std library.
+
+Numpy scalars and arrays are encoded as the matching python numbers and
+lists. Formats:
+    "default" - byte for byte what json.dump writes (", " and ": "
+                separators, ascii only), what existing consumers read
+    "compact" - no whitespace
+    "pretty"  - indented by 2 spaces
+The "default" format always uses the std library's C encoder (json.dumps,
+which is much faster than the streaming json.dump), as orjson can't match
+its output exactly. orjson writes nan as null in the other formats.
+"""
+
+FORMATS = ["default", "compact", "pretty"]
+
+
+def _default(o):
+    """
+    encodes the types json doesn't know: numpy scalars and arrays
+    """
+    if hasattr(o, "tolist"):
+        return o.tolist()
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+
+def _check_format(format):
+    if format not in FORMATS:
+        raise ValueError(f"format must be one of {FORMATS}")
+
+
+def json_dumps(data, format="default") -> bytes:
+    _check_format(format)
+    if format == "compact":
+        text = json.dumps(data, separators=(",", ":"), default=_default)
+    elif format == "pretty":
+        text = json.dumps(data, indent=2, default=_default)
+    else:
+        text = json.dumps(data, default=_default)
+    return text.encode("utf-8")
+
+
+@functools.cache
+def _orjson():
+    import orjson
+
+    return orjson
+
+
+def orjson_dumps(data, format="default") -> bytes:
+    _check_format(format)
+    if format == "default":
+        return json_dumps(data, format)
+    orjson = _orjson()
+    option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+    if format == "pretty":
+        option |= orjson.OPT_INDENT_2
+    return orjson.dumps(data, default=_default, option=option)
+
+
+def orjson_loads(data):
+    try:
+        return _orjson().loads(data)
+    except ValueError:
+        # orjson rejects the NaN and Infinity that json.dump writes
+        return json.loads(data)
+
+
+SERIALIZERS = {"json": (json_dumps, json.loads)}
+if importlib.util.find_spec("orjson") is not None:
+    SERIALIZERS["orjson"] = (orjson_dumps, orjson_loads)
+DEFAULT_SERIALIZER = "orjson" if "orjson" in SERIALIZERS else "json"
+
+
+def register_serializer(name, dumps, loads):
+    SERIALIZERS[name] = (dumps, loads)
+
+
+def get_serializer(name=None) -> tuple:
+    """
+    the (dumps, loads) of the serializer, by default orjson if installed
+    """
+    name = name or DEFAULT_SERIALIZER
+    if name not in SERIALIZERS:
+        raise ValueError(f"serializer must be one of {list(SERIALIZERS)}")
+    return SERIALIZERS[name]
+
+
+def dumps(data, format="default", serializer=None) -> bytes:
+    return get_serializer(serializer)[0](data, format)
+
+
+def loads(data, serializer=None):
+    return get_serializer(serializer)[1](data)
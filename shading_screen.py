@@ -0,0 +1,178 @@
+import itertools
+import numpy as np
+import pandas as pd
+
+from analysis_grid import FACE_NORMALS
+from geometry_check import APERTURE_FIELDS, CASE_FIELDS, case_arrays
+from solar import SolarCache
+
+"""
+Fast analytic estimate of how much of each aperture's glazing is sunlit at
+each time step, for screening whole sweeps of overhang, louvre/fin, vertical
+fin and blind variants before running Radiance. Shadows are the projections
+of each device's outer edge onto the plane of the glazing, treated as
+rectangles, and the devices are assumed to shade independently. The
+geometry conventions are those of geometry_check.
+
+All cases screened together must share the weather file and analysis period
+(they can differ in bearing), screen_cases groups them.
+"""
+
+SCREEN_CASE_FIELDS = CASE_FIELDS + [
+    "blade_angle",
+    "toggle_blind",
+    "blind_percentage_cover",
+    "toggle_opaque_blind",
+    "blind_specular_transmittance",
+]
+SCREEN_APERTURE_FIELDS = APERTURE_FIELDS + ["frame_thickness", "extra_reveal_depth"]
+
+
+def _overlap_fraction(low, high, window_low, window_high):
+    """
+    fraction of the window range covered by [low, high]
+    """
+    covered = np.minimum(high, window_high) - np.maximum(low, window_low)
+    return np.clip(covered / (window_high - window_low), 0, 1)
+
+
+def sunlit_fraction(a: dict, room_sun_vectors: np.ndarray) -> np.ndarray:
+    """
+    (n_cases, max apertures, n_times) fraction of the glazing of each aperture
+    that is sunlit. a is from case_arrays (with the SCREEN fields) and
+    room_sun_vectors is (n_cases, n_times, 3), e.g. from SolarCache.room_sun_vectors
+    """
+    c = {k: a[k][:, None, None] for k in SCREEN_CASE_FIELDS}
+    ap = {k: a[k][:, :, None] for k in SCREEN_APERTURE_FIELDS}
+    face = np.nan_to_num(a["room_face"]).astype(int)
+    normal = FACE_NORMALS[face]  # case, aperture, 3
+    right = np.cross([0, 0, 1.0], normal)
+    s_n = np.einsum("cak,ctk->cat", normal, room_sun_vectors)
+    s_u = np.einsum("cak,ctk->cat", right, room_sun_vectors)
+    s_z = room_sun_vectors[:, None, :, 2]
+    facing = (s_n > 1e-6) & (s_z > 0)
+    s_n = np.where(facing, s_n, 1)
+    tan_vertical = s_z / s_n  # drop of a shadow per m of depth
+    tan_horizontal = s_u / s_n  # sideways shift (to the right) per m of depth
+
+    frame = ap["frame_thickness"]
+    x_low = ap["aperture_offset"] - ap["aperture_width"] / 2 + frame
+    x_high = ap["aperture_offset"] + ap["aperture_width"] / 2 - frame
+    z_low = ap["sill_height"] + frame
+    z_high = ap["sill_height"] + ap["aperture_height"] - frame
+    width, height = x_high - x_low, z_high - z_low
+    sunlit = facing.astype(float)
+
+    # reveal, the glazing set back extra_reveal_depth
+    reveal = ap["extra_reveal_depth"]
+    sunlit *= (1 - np.clip(reveal * tan_vertical / height, 0, 1)) * (
+        1 - np.clip(reveal * np.abs(tan_horizontal) / width, 0, 1)
+    )
+
+    # overhang
+    angle = np.radians(c["overhang_angle"])
+    depth = c["overhang_depth"] * np.cos(angle)
+    tip_z = z_high + frame + c["overhang_height_above_window"] - c["overhang_depth"] * np.sin(angle)
+    shadow_z = tip_z - depth * tan_vertical
+    shift = -depth * tan_horizontal
+    overhang_x = ap["aperture_offset"] + c["overhang_offset"]
+    shaded = _overlap_fraction(shadow_z, np.inf, z_low, z_high) * _overlap_fraction(
+        overhang_x - c["overhang_width"] / 2 + np.minimum(shift, 0),
+        overhang_x + c["overhang_width"] / 2 + np.maximum(shift, 0),
+        x_low,
+        x_high,
+    )
+    sunlit *= 1 - np.where(c["toggle_overhang"] > 0, shaded, 0)
+
+    # louvres (horizontal blades) or fins (vertical blades)
+    fins = c["toggle_fins_or_louvres"] > 0
+    blade = np.radians(c["blade_angle"])
+    spacing = np.maximum(c["distance_between_shades"], 1e-9)
+    tan_profile = np.where(fins, np.abs(tan_horizontal), tan_vertical)
+    blocked = np.clip(
+        c["blade_depth"] * (np.cos(blade) * tan_profile + np.abs(np.sin(blade))) / spacing,
+        0,
+        1,
+    )
+    span = np.maximum(c["number_of_shades"] - 1, 0) * c["distance_between_shades"] / 2
+    x_centre, z_centre = (x_low + x_high) / 2, (z_low + z_high) / 2
+    coverage = np.where(
+        fins,
+        _overlap_fraction(x_centre - span, x_centre + span, x_low, x_high),
+        _overlap_fraction(z_centre - span, z_centre + span, z_low, z_high),
+    )
+    coverage = np.where(c["number_of_shades"] > 0, coverage, 0)
+    sunlit *= 1 - np.where(c["toggle_louvre_creation"] > 0, blocked * coverage, 0)
+
+    # vertical fin, to the right of the window (left if reverse_fin_side)
+    side = np.where(c["reverse_fin_side"] > 0, -1, 1)
+    fin_x = ap["aperture_offset"] + side * (ap["aperture_width"] / 2 + c["fin_window_offset"])
+    fin_shadow_x = fin_x - c["vertical_fin_depth"] * tan_horizontal
+    fin_z = z_centre + c["fin_vertical_offset"]
+    fin_drop = c["vertical_fin_depth"] * tan_vertical
+    shaded = _overlap_fraction(
+        np.minimum(fin_x, fin_shadow_x), np.maximum(fin_x, fin_shadow_x), x_low, x_high
+    ) * _overlap_fraction(
+        fin_z - c["vertical_fin_height"] / 2 - fin_drop,
+        fin_z + c["vertical_fin_height"] / 2,
+        z_low,
+        z_high,
+    )
+    sunlit *= 1 - np.where(c["toggle_external_vertical_fin"] > 0, shaded, 0)
+
+    # blind, only its specular transmittance lets the direct sun through
+    transmittance = np.where(
+        c["toggle_opaque_blind"] > 0, 0, c["blind_specular_transmittance"]
+    )
+    cover = c["blind_percentage_cover"] / 100
+    sunlit *= 1 - np.where(c["toggle_blind"] > 0, cover * (1 - transmittance), 0)
+
+    sunlit = np.where(a["has_aperture"][:, :, None], sunlit, np.nan)
+    return sunlit.astype(np.float32)
+
+
+def screen_cases(cases: list[dict], solar_cache=None, chunk_size=256) -> pd.DataFrame:
+    """
+    ranks cases (full case values, e.g. ShadingModelInput.value) by the
+    direct solar irradiation reaching the glazing. Returns a DataFrame, one
+    row per case in the order given, of the direct gain (kWh) on the sunlit
+    glazing and the mean sunlit fraction while the sun is on the facade,
+    with the rank (1 = least direct gain)
+    """
+    solar_cache = solar_cache or SolarCache()
+    solar_cache.precompute(cases)
+    groups = {}
+    for i, params in enumerate(cases):
+        groups.setdefault(solar_cache.key(params), []).append(i)
+
+    direct_gain = np.zeros(len(cases))
+    mean_sunlit = np.zeros(len(cases))
+    for key, indexes in groups.items():
+        solar = solar_cache.get(cases[indexes[0]])
+        step_hours = 1 / cases[indexes[0]]["timestep"]
+        up = solar["sun_up"]
+        direct_normal = solar["direct_normal"][up]
+        indexes = iter(indexes)
+        while chunk := list(itertools.islice(indexes, chunk_size)):
+            chunk_cases = [cases[i] for i in chunk]
+            a = case_arrays(chunk_cases, SCREEN_CASE_FIELDS, SCREEN_APERTURE_FIELDS)
+            vectors = np.stack(
+                [solar_cache.room_sun_vectors(p)[up] for p in chunk_cases]
+            )
+            sunlit = sunlit_fraction(a, vectors)
+            normal = FACE_NORMALS[np.nan_to_num(a["room_face"]).astype(int)]
+            cos_incidence = np.clip(np.einsum("cak,ctk->cat", normal, vectors), 0, 1)
+            glazing_area = (
+                (a["aperture_width"] - 2 * a["frame_thickness"])
+                * (a["aperture_height"] - 2 * a["frame_thickness"])
+            )[:, :, None]
+            gain = np.nan_to_num(sunlit) * direct_normal * cos_incidence * glazing_area
+            direct_gain[chunk] = gain.sum(axis=(1, 2)) * step_hours / 1000
+            on_facade = (cos_incidence > 0) & a["has_aperture"][:, :, None]
+            mean_sunlit[chunk] = np.nansum(
+                np.where(on_facade, sunlit, 0), axis=(1, 2)
+            ) / np.maximum(on_facade.sum(axis=(1, 2)), 1)
+
+    df = pd.DataFrame({"direct_gain_kwh": direct_gain, "mean_sunlit_fraction": mean_sunlit})
+    df["rank"] = df["direct_gain_kwh"].rank(method="first").astype(int)
+    return df
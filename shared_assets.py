@@ -0,0 +1,115 @@
+import functools
+import hashlib
+import os
+import shutil
+
+import serializers
+
+"""
+Shared input files of a sweep. Every case names the same few context and
+custom shade HBJSON files (often on a network share), so AssetStore
+fingerprints each referenced file once, hard links (or copies, across
+devices) each distinct file into one sweep level folder and rewrites the
+case inputs to point at it. load_hbjson parses each file once per process.
+"""
+
+ASSET_FIELDS = ["context_filepath", "custom_shade_filepath"]
+LINK_MODES = ["hardlink", "copy"]
+CHUNK_SIZE = 1 << 20
+
+
+@functools.lru_cache(maxsize=None)
+def _file_hash(filepath, mtime_ns, size) -> str:
+    sha = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        while chunk := f.read(CHUNK_SIZE):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def file_hash(filepath) -> str:
+    """
+    sha256 of the file contents, only read again if the file changes
+    """
+    stat = os.stat(filepath)
+    return _file_hash(os.path.abspath(filepath), stat.st_mtime_ns, stat.st_size)
+
+
+class AssetStore:
+    """
+    <folder>/<file hash>/<file name>, one per distinct file
+    """
+
+    def __init__(self, folder, link="hardlink"):
+        if link not in LINK_MODES:
+            raise ValueError(f"link must be one of {LINK_MODES}")
+        self.folder = folder
+        self.link = link
+        self._stored = {}  # source path -> stored path
+        self._rewrites = {}  # path as given -> stored path, None if not a file
+        os.makedirs(folder, exist_ok=True)
+
+    def add(self, filepath) -> str:
+        """
+        stores the file (once per distinct contents) and returns its stored path
+        """
+        filepath = os.path.abspath(filepath)
+        if filepath not in self._stored:
+            asset_folder = os.path.join(self.folder, file_hash(filepath))
+            stored = os.path.join(asset_folder, os.path.basename(filepath))
+            if not os.path.exists(stored):
+                os.makedirs(asset_folder, exist_ok=True)
+                tmp_stored = stored + ".tmp"
+                try:
+                    if self.link != "hardlink":
+                        raise OSError
+                    os.link(filepath, tmp_stored)
+                except OSError:
+                    shutil.copy2(filepath, tmp_stored)
+                os.replace(tmp_stored, stored)
+            self._stored[filepath] = os.path.abspath(stored)
+        return self._stored[filepath]
+
+    def _rewrite_path(self, filepath):
+        if filepath not in self._rewrites:
+            self._rewrites[filepath] = (
+                self.add(filepath) if os.path.isfile(filepath) else None
+            )
+        return self._rewrites[filepath]
+
+    def rewrite(self, params: dict) -> dict:
+        """
+        params with the asset filepaths pointing at the store. Empty or missing
+        files are left as they are. Each path is only checked the first time
+        it is seen
+        """
+        rewritten = {
+            k: stored
+            for k in ASSET_FIELDS
+            if params.get(k) and (stored := self._rewrite_path(params[k]))
+        }
+        return params | rewritten if rewritten else params
+
+
+@functools.lru_cache(maxsize=32)
+def _load_hbjson(filepath, mtime_ns, size) -> dict:
+    with open(filepath, "rb") as f:
+        return serializers.loads(f.read())
+
+
+def load_hbjson(filepath) -> dict:
+    """
+    the parsed HBJSON file, parsed once per process (and again if it changes).
+    The dict is shared between callers so must not be modified
+    """
+    stat = os.stat(filepath)
+    return _load_hbjson(os.path.abspath(filepath), stat.st_mtime_ns, stat.st_size)
+
+
+def load_hbjson_model(filepath):
+    """
+    the HBJSON file as a honeybee Model, requires honeybee-core
+    """
+    from honeybee.model import Model
+
+    return Model.from_dict(load_hbjson(filepath))
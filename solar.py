@@ -0,0 +1,196 @@
+import hashlib
+import os
+import numpy as np
+import pandas as pd
+
+from timeseries_store import PERIOD_FIELDS, analysis_period_hoys
+
+"""
+Per-sweep precomputation of sun positions and irradiance. Cases in a sweep
+share a few weather files and analysis periods and mostly differ in bearing,
+so each distinct EPW is parsed once, the sun vectors and direct/diffuse
+irradiance over the analysis period are computed once per (EPW hash, period,
+timestep) and the bearings are applied to them as one batched rotation.
+
+Sun vectors are unit vectors towards the sun, x east, y north, z up, at the
+middle of each time step (NOAA solar position equations). The room frame is
+the world frame turned so that +y (face 3) points along the bearing.
+Hourly EPW values are taken at the middle of their hour and linearly
+interpolated for sub-hourly time steps.
+"""
+
+EPW_COLUMNS = {
+    "month": 1,
+    "day": 2,
+    "hour": 3,
+    "global_horizontal": 13,
+    "direct_normal": 14,
+    "diffuse_horizontal": 15,
+}
+
+
+def read_epw(filepath):
+    """
+    returns the location ({latitude, longitude, time_zone, elevation}) and a
+    DataFrame of the hourly irradiance columns of an EPW file
+    """
+    with open(filepath, "r") as f:
+        location = f.readline().strip().split(",")
+    data = pd.read_csv(
+        filepath,
+        skiprows=8,
+        header=None,
+        usecols=list(EPW_COLUMNS.values()),
+    )
+    data.columns = list(EPW_COLUMNS.keys())
+    return {
+        "latitude": float(location[6]),
+        "longitude": float(location[7]),
+        "time_zone": float(location[8]),
+        "elevation": float(location[9]),
+    }, data
+
+
+def sun_vectors(latitude, longitude, time_zone, hoys) -> np.ndarray:
+    """
+    (n, 3) unit vectors towards the sun at each hour of the year (local standard time)
+    """
+    hoys = np.asarray(hoys, dtype=float)
+    doy = np.floor(hoys / 24) + 1
+    hour = hoys % 24
+    gamma = 2 * np.pi / 365 * (doy - 1 + (hour - 12) / 24)
+    eqtime = 229.18 * (
+        0.000075
+        + 0.001868 * np.cos(gamma)
+        - 0.032077 * np.sin(gamma)
+        - 0.014615 * np.cos(2 * gamma)
+        - 0.040849 * np.sin(2 * gamma)
+    )
+    decl = (
+        0.006918
+        - 0.399912 * np.cos(gamma)
+        + 0.070257 * np.sin(gamma)
+        - 0.006758 * np.cos(2 * gamma)
+        + 0.000907 * np.sin(2 * gamma)
+        - 0.002697 * np.cos(3 * gamma)
+        + 0.00148 * np.sin(3 * gamma)
+    )
+    true_solar_minutes = hour * 60 + eqtime + 4 * longitude - 60 * time_zone
+    hour_angle = np.radians(true_solar_minutes / 4 - 180)
+    lat = np.radians(latitude)
+    return np.column_stack(
+        [
+            -np.cos(decl) * np.sin(hour_angle),
+            np.sin(decl) * np.cos(lat) - np.cos(decl) * np.sin(lat) * np.cos(hour_angle),
+            np.sin(decl) * np.sin(lat) + np.cos(decl) * np.cos(lat) * np.cos(hour_angle),
+        ]
+    )
+
+
+def bearing_rotations(bearings) -> np.ndarray:
+    """
+    (m, 3, 3) matrices taking world vectors into the frame of rooms at each bearing
+    """
+    theta = np.radians(np.asarray(bearings, dtype=float))
+    cos, sin = np.cos(theta), np.sin(theta)
+    rotations = np.zeros((len(theta), 3, 3))
+    rotations[:, 0, 0] = cos
+    rotations[:, 0, 1] = -sin
+    rotations[:, 1, 0] = sin
+    rotations[:, 1, 1] = cos
+    rotations[:, 2, 2] = 1
+    return rotations
+
+
+def rotate_to_bearings(vectors, bearings) -> np.ndarray:
+    """
+    (m, n, 3) vectors in the room frame for each of the m bearings
+    """
+    return np.einsum("mij,nj->mni", bearing_rotations(bearings), vectors)
+
+
+def period_irradiance(data: pd.DataFrame, hoys) -> dict:
+    """
+    the EPW irradiance columns at each hour of the year
+    """
+    hourly_hoys = np.arange(len(data)) + 0.5
+    return {
+        k: np.interp(hoys, hourly_hoys, data[k].to_numpy(dtype=float), period=8760)
+        for k in ["global_horizontal", "direct_normal", "diffuse_horizontal"]
+    }
+
+
+class SolarCache:
+    """
+    Solar data for a sweep, keyed on (EPW hash, analysis period, timestep)
+    """
+
+    def __init__(self):
+        self._epw_hashes = {}  # (path, mtime, size) -> hash
+        self._epws = {}  # hash -> (location, data)
+        self._solar = {}  # key -> dict of arrays
+        self._rotated = {}  # (key, bearing) -> (n, 3) sun vectors in the room frame
+
+    def epw_hash(self, filepath) -> str:
+        stat = os.stat(filepath)
+        file_key = (os.path.abspath(filepath), stat.st_mtime_ns, stat.st_size)
+        if file_key not in self._epw_hashes:
+            with open(filepath, "rb") as f:
+                self._epw_hashes[file_key] = hashlib.sha256(f.read()).hexdigest()
+        return self._epw_hashes[file_key]
+
+    def key(self, params: dict) -> tuple:
+        period = tuple(params[k] for k in PERIOD_FIELDS)
+        return (self.epw_hash(params["epw_filepath"]),) + period
+
+    def get(self, params: dict) -> dict:
+        """
+        hoys, sun vectors (world frame), sun_up and irradiance arrays for the
+        weather file and analysis period of the case. params must be the full
+        case value (e.g. ShadingModelInput.value)
+        """
+        key = self.key(params)
+        if key not in self._solar:
+            epw_hash = key[0]
+            if epw_hash not in self._epws:
+                self._epws[epw_hash] = read_epw(params["epw_filepath"])
+            location, data = self._epws[epw_hash]
+            hoys = analysis_period_hoys(params) + 0.5 / params["timestep"]
+            vectors = sun_vectors(
+                location["latitude"], location["longitude"], location["time_zone"], hoys
+            )
+            solar = {"hoys": hoys, "sun_vectors": vectors, "sun_up": vectors[:, 2] > 0}
+            solar |= period_irradiance(data, hoys)
+            for array in solar.values():
+                array.flags.writeable = False
+            self._solar[key] = solar
+        return self._solar[key]
+
+    def precompute(self, cases):
+        """
+        computes the solar data for every distinct weather file and period in
+        cases, and the sun vectors for every distinct bearing of each in one
+        batched rotation
+        """
+        bearings = {}
+        for params in cases:
+            key = self.key(params)
+            self.get(params)
+            bearings.setdefault(key, set()).add(float(params["bearing"]))
+        for key, key_bearings in bearings.items():
+            key_bearings = sorted(b for b in key_bearings if (key, b) not in self._rotated)
+            if not key_bearings:
+                continue
+            rotated = rotate_to_bearings(self._solar[key]["sun_vectors"], key_bearings)
+            rotated.flags.writeable = False
+            for bearing, vectors in zip(key_bearings, rotated):
+                self._rotated[(key, bearing)] = vectors
+
+    def room_sun_vectors(self, params: dict) -> np.ndarray:
+        """
+        (n, 3) sun vectors in the frame of the room of the case
+        """
+        key = (self.key(params), float(params["bearing"]))
+        if key not in self._rotated:
+            self.precompute([params])
+        return self._rotated[key]
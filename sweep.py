@@ -0,0 +1,163 @@
+import itertools
+import math
+import numpy as np
+
+from shading_models import FIELD_SECTIONS, PARAMETER_SECTIONS
+
+"""
+Multi-parameter sweep definitions. Cases are yielded one at a time from
+generators so that large design spaces never have to be held in memory.
+
+Axes are given as a dict of parameter name to one of:
+    (start_value, end_value, step) - evenly spaced values, as single_parameter_variation
+    [value, value, ...]            - explicit list of values
+    (start_value, end_value)       - bounds, only for the sampled methods
+
+Parameter names are the top level fields of the sections (see
+shading_models.FIELD_SECTIONS). The fields of each aperture (sill_height,
+aperture_width...) can't be axes of their own, instead give a list of whole
+apertures lists as the values of an "apertures" grid axis.
+"""
+
+SWEEP_METHODS = ["grid", "latin_hypercube", "sobol"]
+
+
+def _n_values(start_value, end_value, step):
+    return int(round((end_value - start_value) / step, 0) + 1)
+
+
+def linspace_values(start_value, end_value, step):
+    """
+    evenly spaced values from start_value to end_value (inclusive), rounded to 3dp
+    """
+    return np.linspace(
+        start_value, end_value, _n_values(start_value, end_value, step)
+    ).round(decimals=3)
+
+
+def _check_axis_names(axes):
+    for name in axes:
+        if name not in FIELD_SECTIONS:
+            raise ValueError(f"'{name}' does not exist")
+
+
+def _is_int_field(name):
+    model = PARAMETER_SECTIONS[FIELD_SECTIONS[name]]
+    return model.model_fields[name].annotation is int
+
+
+def _check_grid_axis(spec):
+    if isinstance(spec, tuple) and len(spec) != 3:
+        raise ValueError(
+            "grid axes must be (start_value, end_value, step) or a list of values"
+        )
+
+
+def axis_values(spec):
+    """
+    returns the list of values for a grid axis
+    """
+    _check_grid_axis(spec)
+    if isinstance(spec, tuple):
+        return linspace_values(*spec).tolist()
+    return list(spec)
+
+
+def axis_length(spec) -> int:
+    """
+    number of values of a grid axis, counted without making them
+    """
+    _check_grid_axis(spec)
+    if isinstance(spec, tuple):
+        n_values = _n_values(*spec)
+        if n_values < 0:
+            raise ValueError(f"Number of samples, {n_values}, must be non-negative.")
+        return n_values
+    return len(spec)
+
+
+def _axis_bounds(name, spec):
+    if not (isinstance(spec, tuple) and len(spec) == 2):
+        raise ValueError(f"'{name}' must be given as (start_value, end_value) to sample")
+    return spec
+
+
+def grid_cases(axes: dict):
+    """
+    yields a dict for every combination of the axis values (cartesian product)
+    """
+    _check_axis_names(axes)
+    names = list(axes.keys())
+    values = [axis_values(spec) for spec in axes.values()]
+    for combination in itertools.product(*values):
+        yield dict(zip(names, combination))
+
+
+def _scale_samples(axes, unit_samples):
+    """
+    scales samples in [0, 1) to the axis bounds, rounding for int fields
+    """
+    names = list(axes.keys())
+    bounds = np.array([_axis_bounds(name, spec) for name, spec in axes.items()])
+    samples = bounds[:, 0] + unit_samples * (bounds[:, 1] - bounds[:, 0])
+    samples = samples.round(decimals=3)
+    int_fields = [i for i, name in enumerate(names) if _is_int_field(name)]
+    for row in samples.tolist():
+        for i in int_fields:
+            row[i] = int(round(row[i]))
+        yield dict(zip(names, row))
+
+
+def latin_hypercube_cases(axes: dict, n_samples: int, seed=None, chunk_size=10000):
+    """
+    yields n_samples latin hypercube samples within the axis bounds
+    only one permutation per axis is held in memory, samples are made in chunks
+    """
+    _check_axis_names(axes)
+    rng = np.random.default_rng(seed)
+    permutations = [rng.permutation(n_samples) for _ in axes]
+    for start in range(0, n_samples, chunk_size):
+        stop = min(start + chunk_size, n_samples)
+        strata = np.column_stack([p[start:stop] for p in permutations])
+        unit_samples = (strata + rng.random(strata.shape)) / n_samples
+        yield from _scale_samples(axes, unit_samples)
+
+
+def sobol_cases(axes: dict, n_samples: int, seed=None, chunk_size=8192):
+    """
+    yields n_samples scrambled sobol samples within the axis bounds, drawn in
+    chunks of chunk_size (a power of 2). n_samples should be a power of 2 too,
+    otherwise the samples lose the balance properties of the sequence.
+    requires scipy
+    """
+    from scipy.stats import qmc
+
+    _check_axis_names(axes)
+    engine = qmc.Sobol(d=len(axes), seed=seed)
+    for start in range(0, n_samples, chunk_size):
+        unit_samples = engine.random(min(chunk_size, n_samples - start))
+        yield from _scale_samples(axes, unit_samples)
+
+
+def sweep_cases(axes: dict, method="grid", n_samples=None, seed=None):
+    """
+    yields the parameter dict for each case of the sweep
+    """
+    if method == "grid":
+        return grid_cases(axes)
+    if n_samples is None:
+        raise ValueError(f"n_samples must be given for method '{method}'")
+    if method == "latin_hypercube":
+        return latin_hypercube_cases(axes, n_samples, seed=seed)
+    if method == "sobol":
+        return sobol_cases(axes, n_samples, seed=seed)
+    raise ValueError(f"method must be one of {SWEEP_METHODS}")
+
+
+def case_count(axes: dict, method="grid", n_samples=None):
+    """
+    number of cases the sweep will produce, without generating them
+    """
+    if method == "grid":
+        return math.prod(axis_length(spec) for spec in axes.values())
+    return n_samples
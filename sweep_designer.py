@@ -0,0 +1,242 @@
+import threading
+import time
+import ipywidgets as w
+
+import serializers
+from shading_models import FIELD_SECTIONS, PARAMETER_SECTIONS, ShadingModelInput
+from sweep import SWEEP_METHODS, case_count, latin_hypercube_cases
+
+"""
+Panel for designing a sweep around the current inputs of a
+ShadingModelInputUi. Any numeric field can be added as an axis with a
+start, end and (for the grid method) step. The case count, disk space and
+run cost update as the axes change, and the case folders are generated by
+multi_parameter_variation in a background thread so the notebook stays
+responsive.
+"""
+
+# bytes of the case folder (3 directories) besides the input file
+FOLDER_BYTES = 3 * 4096
+# cases used to estimate the average run cost
+N_COST_SAMPLES = 32
+
+
+def numeric_fields() -> list[str]:
+    return [
+        name
+        for name, section in FIELD_SECTIONS.items()
+        if PARAMETER_SECTIONS[section].model_fields[name].annotation in (int, float)
+    ]
+
+
+def _format_bytes(n_bytes):
+    for unit in ["B", "KB", "MB", "GB"]:
+        if n_bytes < 1024:
+            return f"{n_bytes:.1f} {unit}"
+        n_bytes /= 1024
+    return f"{n_bytes:.1f} TB"
+
+
+def _format_seconds(seconds):
+    if seconds < 120:
+        return f"{seconds:.0f} s"
+    if seconds < 2 * 3600:
+        return f"{seconds / 60:.0f} min"
+    return f"{seconds / 3600:.1f} h"
+
+
+class SweepAxis(w.HBox):
+    """
+    one axis of the sweep: start, end and step of a field
+    """
+
+    def __init__(self, name, value, on_remove):
+        self.name = name
+        self.start = w.FloatText(value=value, description="start", layout={"width": "160px"})
+        self.end = w.FloatText(value=value, description="end", layout={"width": "160px"})
+        self.step = w.FloatText(value=1.0, description="step", layout={"width": "160px"})
+        self.remove = w.Button(icon="times", layout={"width": "40px"})
+        self.remove.on_click(lambda _: on_remove(self))
+        super().__init__(
+            [w.Label(name, layout={"width": "220px"}), self.start, self.end, self.step, self.remove]
+        )
+
+    def spec(self, method):
+        if method == "grid":
+            return (self.start.value, self.end.value, self.step.value)
+        return (self.start.value, self.end.value)
+
+
+class SweepDesigner(w.VBox):
+    """
+    ui is the ShadingModelInputUi whose value the cases vary from. With a
+    fitted cost_model (cost_model.CostModel) the run cost is shown as time,
+    otherwise as the relative cost from the model priors
+    """
+
+    def __init__(self, ui, cost_model=None, parent_folder="sweep"):
+        self.ui = ui
+        self.cost_model = cost_model
+        self.axes = []
+        self._thread = None
+        self._cancel = threading.Event()
+
+        self.field = w.Dropdown(options=numeric_fields(), description="field")
+        self.add = w.Button(description="add axis", icon="plus")
+        self.add.on_click(lambda _: self.add_axis(self.field.value))
+        self.axes_box = w.VBox()
+        self.method = w.Dropdown(options=SWEEP_METHODS, value="grid", description="method")
+        self.n_samples = w.IntText(value=100, description="samples", disabled=True)
+        self.seed = w.IntText(value=0, description="seed", disabled=True)
+        self.drop_invalid = w.Checkbox(value=True, description="drop invalid cases")
+        self.estimate = w.HTML()
+        self.parent_folder = w.Text(value=parent_folder, description="folder")
+        self.generate = w.Button(description="generate", icon="play", button_style="success")
+        self.generate.on_click(lambda _: self.start())
+        self.cancel = w.Button(description="cancel", icon="stop", disabled=True)
+        self.cancel.on_click(lambda _: self._cancel.set())
+        self.progress = w.IntProgress(value=0, min=0, max=1, description="cases")
+        self.status = w.Label()
+        for widget in [self.method, self.n_samples, self.drop_invalid]:
+            widget.observe(lambda _: self.update_estimate(), "value")
+        self.ui.observe(lambda _: self.update_estimate(), "_value")
+        super().__init__(
+            [
+                w.HBox([self.field, self.add]),
+                self.axes_box,
+                w.HBox([self.method, self.n_samples, self.seed]),
+                self.drop_invalid,
+                self.estimate,
+                w.HBox([self.parent_folder, self.generate, self.cancel]),
+                w.HBox([self.progress, self.status]),
+            ]
+        )
+        self.update_estimate()
+
+    def add_axis(self, name) -> SweepAxis:
+        if name in [axis.name for axis in self.axes]:
+            raise ValueError(f"'{name}' is already an axis")
+        axis = SweepAxis(name, self.ui.value[name], self.remove_axis)
+        for widget in [axis.start, axis.end, axis.step]:
+            widget.observe(lambda _: self.update_estimate(), "value")
+        self.axes.append(axis)
+        self.axes_box.children = self.axes
+        self.update_estimate()
+        return axis
+
+    def remove_axis(self, axis):
+        self.axes.remove(axis)
+        self.axes_box.children = self.axes
+        self.update_estimate()
+
+    def sweep_axes(self) -> dict:
+        return {axis.name: axis.spec(self.method.value) for axis in self.axes}
+
+    def _n_cases(self):
+        sampled = self.method.value != "grid"
+        self.n_samples.disabled = not sampled
+        self.seed.disabled = not sampled
+        if not self.axes:
+            return 0
+        if not sampled and any(axis.step.value <= 0 for axis in self.axes):
+            raise ValueError("the step of every grid axis must be positive")
+        return case_count(self.sweep_axes(), self.method.value, self.n_samples.value)
+
+    def _cost_per_case(self, value):
+        from cost_model import CostModel
+
+        cost_model = self.cost_model or CostModel()
+        bounds = {axis.name: (axis.start.value, axis.end.value) for axis in self.axes}
+        samples = latin_hypercube_cases(bounds, N_COST_SAMPLES, seed=0) if bounds else [{}]
+        headless = ShadingModelInput(value)
+        cases = []
+        for case in samples:
+            headless.value = case
+            cases.append(headless.value)
+        return cost_model.estimate(cases).mean()
+
+    def update_estimate(self):
+        """
+        updates the case count and the disk and run cost estimates
+        """
+        try:
+            n_cases = self._n_cases()
+            value = self.ui.value
+            case_bytes = len(serializers.dumps(value)) + FOLDER_BYTES
+            cost = n_cases * self._cost_per_case(value) if n_cases else 0
+        except ValueError as e:
+            self.estimate.value = f"<b>{e}</b>"
+            return
+        cost = _format_seconds(cost) if self.cost_model else f"{cost:.3g} (relative)"
+        up_to = "up to " if self.drop_invalid.value else ""
+        self.estimate.value = (
+            f"<b>{up_to}{n_cases:,} cases</b>, "
+            f"disk {_format_bytes(n_cases * case_bytes)}, run cost {cost}"
+        )
+
+    def start(self):
+        """
+        generates the case folders in a background thread
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return
+        n_cases = self._n_cases()
+        if not n_cases:
+            self.status.value = "add an axis to sweep"
+            return
+        self._cancel.clear()
+        self.progress.max, self.progress.value = n_cases, 0
+        self.generate.disabled, self.cancel.disabled = True, False
+        self._thread = threading.Thread(
+            target=self._generate,
+            args=(
+                self.parent_folder.value,
+                self.sweep_axes(),
+                self.ui.value,
+                self.method.value,
+                self.n_samples.value if self.method.value != "grid" else None,
+                self.seed.value if self.method.value != "grid" else None,
+                self.drop_invalid.value,
+            ),
+            daemon=True,
+        )
+        self._thread.start()
+
+    def _generate(self, parent_folder, axes, global_params, method, n_samples, seed, drop_invalid):
+        from file_creation import multi_parameter_variation
+
+        start = time.perf_counter()
+        n_written = 0
+        try:
+            for n_written, _ in enumerate(
+                multi_parameter_variation(
+                    parent_folder,
+                    axes,
+                    global_params,
+                    method=method,
+                    n_samples=n_samples,
+                    seed=seed,
+                    drop_invalid=drop_invalid,
+                    progress=None,
+                ),
+                start=1,
+            ):
+                if self._cancel.is_set():
+                    break
+                if n_written % 50 == 0:
+                    self.progress.value = n_written
+            elapsed = time.perf_counter() - start
+            stopped = "cancelled after" if self._cancel.is_set() else "wrote"
+            self.status.value = f"{stopped} {n_written} cases in {_format_seconds(elapsed)}"
+        except Exception as e:
+            self.status.value = f"failed after {n_written} cases: {e}"
+        finally:
+            self.progress.value = n_written
+            self.generate.disabled, self.cancel.disabled = False, True
+
+    def wait(self, timeout=None):
+        """
+        waits for the generation to finish
+        """
+        if self._thread is not None:
+            self._thread.join(timeout)
@@ -0,0 +1,103 @@
+import json
+import time
+import numpy as np
+
+from jsonl_log import JsonLinesLog
+
+"""
+Append-only manifest of a sweep, recording the status of each case so that
+a sweep that dies part way through can be resumed, regenerating only the
+cases that weren't written. One json object per line (see jsonl_log.py): the first line holds
+the sweep definition, each following line a status change of a case (by its
+number in the sweep). Lines are flushed and fsync'd in batches, except that
+the "planned" record naming a case is fsync'd before its folder is written,
+so a resumed sweep reuses the name rather than orphaning the folder.
+"""
+
+CASE_STATUSES = ["planned", "written", "simulated", "failed"]
+DONE_STATUSES = ["written", "simulated"]
+
+
+def _jsonable(data):
+    return json.loads(
+        json.dumps(data, default=lambda o: o.item() if isinstance(o, np.generic) else str(o))
+    )
+
+
+class SweepManifest(JsonLinesLog):
+    def __init__(self, filepath, fsync_every=100):
+        self.definition = None
+        self._cases = {}  # case number -> latest record
+        self._numbers = {}  # case name -> case number
+        super().__init__(filepath, fsync_every=fsync_every)
+
+    def _replay_entry(self, entry):
+        if "sweep" in entry:
+            self.definition = entry["sweep"]
+        else:
+            self._apply(entry)
+
+    def _apply(self, entry):
+        record = self._cases.setdefault(entry["case"], {})
+        record |= entry
+        if "name" in entry:
+            self._numbers[entry["name"]] = entry["case"]
+
+    def open_sweep(self, definition: dict) -> dict:
+        """
+        records the sweep definition in a new manifest, or checks it matches
+        the one being resumed. Returns the recorded definition
+        """
+        definition = _jsonable(definition)
+        if self.definition is None:
+            self.definition = definition
+            self._write({"sweep": definition})
+            self.flush()
+        elif self.definition != definition:
+            raise ValueError(
+                f"{self.filepath} is the manifest of a different sweep, "
+                f"{self.definition} != {definition}"
+            )
+        return self.definition
+
+    def record(self, case_number, status, **info):
+        if status not in CASE_STATUSES:
+            raise ValueError(f"status must be one of {CASE_STATUSES}")
+        entry = {"case": case_number, "status": status, "time": time.time()} | info
+        self._apply(entry)
+        self._write(entry)
+
+    def set_status(self, name, status, **info):
+        """
+        records the status of a case by its name, e.g. once simulated
+        """
+        if name not in self._numbers:
+            raise ValueError(f"'{name}' does not exist")
+        self.record(self._numbers[name], status, **info)
+
+    def status(self, case_number) -> str | None:
+        return self._cases.get(case_number, {}).get("status")
+
+    def name(self, case_number) -> str | None:
+        return self._cases.get(case_number, {}).get("name")
+
+    def case_numbers(self, status) -> list[int]:
+        return [i for i, record in self._cases.items() if record["status"] == status]
+
+    def written(self) -> list[tuple]:
+        """
+        (name, filepath) of every case written (or simulated), by case number
+        """
+        return [
+            (record["name"], record["filepath"])
+            for _, record in sorted(self._cases.items())
+            if record["status"] in DONE_STATUSES
+        ]
+
+    def pending(self, numbered_cases):
+        """
+        passes on the (case number, case) that haven't been written yet
+        """
+        for i, case in numbered_cases:
+            if self.status(i) not in DONE_STATUSES:
+                yield i, case
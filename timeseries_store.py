@@ -0,0 +1,148 @@
+import datetime
+import os
+import pathlib
+import numpy as np
+import pandas as pd
+
+from file_creation import read_json, save_json
+from shading_models import ShadingModelInput
+
+"""
+Compact on-disk store for the per-case time series results (e.g. irradiance
+or illuminance over the working plane grid). Each variable of a case is a
+float32 .npy array of shape (grid points, time steps) that is opened as a
+numpy memmap, so one grid point over the year is a contiguous read and whole
+cases never have to be loaded.
+
+The time axis is derived from the analysis period of the case as in a
+Ladybug AnalysisPeriod: every day from the start date to the end date
+(wrapping over the new year if the end is before the start), the hours
+start_hour to end_hour of each day, each split into timestep steps.
+"""
+
+YEAR = 1900  # as check_date, not a leap year
+PERIOD_FIELDS = [
+    "start_month",
+    "start_day",
+    "start_hour",
+    "end_month",
+    "end_day",
+    "end_hour",
+    "timestep",
+]
+META_NAME = "meta"
+
+
+def _day_of_year(month, day):
+    return datetime.date(YEAR, month, day).timetuple().tm_yday
+
+
+def analysis_period_hoys(params: dict) -> np.ndarray:
+    """
+    hours of the year (from 0 at the start of 1 Jan) of each time step
+    """
+    p = ShadingModelInput.default_value("simulation_params") | params
+    start_doy = _day_of_year(p["start_month"], p["start_day"])
+    end_doy = _day_of_year(p["end_month"], p["end_day"])
+    if end_doy >= start_doy:
+        days = np.arange(start_doy, end_doy + 1)
+    else:
+        days = np.concatenate([np.arange(start_doy, 366), np.arange(1, end_doy + 1)])
+    hours = np.arange(p["start_hour"], p["end_hour"] + 1)
+    steps = np.arange(p["timestep"]) / p["timestep"]
+    hoys = (days[:, None, None] - 1) * 24 + hours[None, :, None] + steps[None, None, :]
+    return hoys.ravel()
+
+
+def analysis_period(params: dict) -> np.ndarray:
+    """
+    the time of each step of the analysis period as datetime64
+    """
+    hoys = analysis_period_hoys(params)
+    next_year = np.cumsum(np.diff(hoys, prepend=hoys[:1]) < 0) > 0
+    minutes = np.round((hoys + next_year * 8760) * 60).astype("timedelta64[m]")
+    return np.datetime64(f"{YEAR}-01-01T00:00") + minutes
+
+
+class TimeSeriesStore:
+    """
+    <folder>/<case name>/<variable>.npy, with the analysis period of the case
+    in <folder>/<case name>/meta.json
+    """
+
+    def __init__(self, folder):
+        self.folder = folder
+
+    def _case_folder(self, name):
+        return os.path.join(self.folder, name)
+
+    def _meta(self, name) -> dict:
+        return read_json(os.path.join(self._case_folder(name), META_NAME + ".json"))
+
+    def create(self, name, variable, n_points, params: dict) -> np.memmap:
+        """
+        creates a zeroed (n_points, n time steps) float32 array for the case
+        and returns it as a writable memmap
+        """
+        fpath = self._case_folder(name)
+        pathlib.Path(fpath).mkdir(parents=True, exist_ok=True)
+        period = {k: v for k, v in params.items() if k in PERIOD_FIELDS}
+        save_json(period, META_NAME, fpath)
+        n_times = len(analysis_period_hoys(period))
+        return np.lib.format.open_memmap(
+            os.path.join(fpath, variable + ".npy"),
+            mode="w+",
+            dtype=np.float32,
+            shape=(n_points, n_times),
+        )
+
+    def open(self, name, variable, mode="r") -> np.memmap:
+        return np.load(
+            os.path.join(self._case_folder(name), variable + ".npy"), mmap_mode=mode
+        )
+
+    def times(self, name) -> np.ndarray:
+        return analysis_period(self._meta(name))
+
+    def point_series(self, name, variable, point) -> pd.Series:
+        """
+        the time series of one grid point, read without loading the case
+        """
+        return pd.Series(
+            np.asarray(self.open(name, variable)[point]), index=self.times(name)
+        )
+
+    def write_ill(
+        self,
+        name,
+        variable,
+        ill_filepath,
+        sun_up_hours_filepath,
+        params,
+        chunk_size=1000,
+    ):
+        """
+        stores a Radiance .ill file (grid points x sun up hours, tab separated),
+        reading chunk_size grid points at a time. Hours that aren't sun up are 0.
+        Returns the memmap
+        """
+        hoys = analysis_period_hoys(params)
+        order = np.argsort(hoys)  # periods over the new year aren't sorted
+        sun_up_hoys = np.loadtxt(sun_up_hours_filepath, ndmin=1)
+        step = np.searchsorted(hoys[order], sun_up_hoys + 1e-6, side="right") - 1
+        in_period = (step >= 0) & (
+            sun_up_hoys - hoys[order][step.clip(min=0)] < 1 / params.get("timestep", 1)
+        )
+        columns = order[step[in_period]]
+        with open(ill_filepath, "r") as f:
+            n_points = sum(1 for _ in f)
+        data = self.create(name, variable, n_points, params)
+        start = 0
+        for chunk in pd.read_csv(
+            ill_filepath, sep="\t", header=None, chunksize=chunk_size, dtype=np.float32
+        ):
+            values = chunk.to_numpy()
+            data[start : start + len(values), columns] = values[:, in_period]
+            start += len(values)
+        data.flush()
+        return data